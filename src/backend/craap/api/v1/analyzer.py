@@ -1,15 +1,30 @@
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple
 
 from fastapi import APIRouter, Form, Request, Response
 import logging as logger
 
-from src.backend.craap.model.data_model import AnalysisResponse
+from src.backend.craap.model.data_model import AnalysisResponse, FetchedPage
 from datetime import datetime
+import dataclasses
+import json
 
 from fastapi import HTTPException
-import aiohttp
+from fastapi.responses import StreamingResponse
 import asyncio
-from src.backend.craap.processing.extractor import MetaTagExtractor
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.backend.craap.config import setting
+from src.backend.craap.processing.cache import get_cache, cache_ttl
+from src.backend.craap.processing.canonical import AliasMap, AnalysisCache, canonicalize_url, trusted_canonical
+from src.backend.craap.processing.feeds import FEED_FIELDS, SiteCrawler, SiteLimits
+from src.backend.craap.processing.extractor import (
+    ENRICHERS, MetaTagExtractor, enrichers_for, mask_fields, needs_html, resolve_enrichers, resolve_fields
+)
+from src.backend.craap.processing.limits import ParseLimits, decode_body, read_body
+from src.backend.craap.processing.profiling import (
+    SamplingProfiler, StageTimer, profiling_allowed, should_sample, write_profile
+)
 from urllib.parse import urlparse
 
 
@@ -53,22 +68,38 @@ router = APIRouter()
 
 
 @router.options("/analyze/url")
+@router.options("/analyze/url/stream")
+@router.options("/analyze/site")
 async def analyze_url_options(response: Response):
     # Respond to CORS preflight requests
     response.headers["Access-Control-Allow-Origin"] = "*"
     response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Profile-Token"
     return Response(status_code=204, headers={
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Methods": "POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization"
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Profile-Token"
     })
 
 
-async def fetch_html_content(url: str) -> str:
+async def fetch_page(url: str) -> FetchedPage:
     """
-    Fetch HTML content from a URL with proper headers and error handling
+    Fetch a page from a URL with proper headers and error handling, following redirects.
+    Successful fetches (body, final URL and redirect chain) are kept in the shared page
+    cache. Bodies are read up to MAX_HTML_BYTES (plus one byte, so the extractor can tell
+    the page was cut).
     """
+    cache = get_cache()
+    cache_key = f"page:{url}"
+    cached = cache.get_json(cache_key)
+    if isinstance(cached, dict) and "html" in cached:
+        return FetchedPage(html=cached["html"], url=cached.get("url") or url, redirects=cached.get("redirects") or [])
+
+    # aiohttp is only needed once we actually go to the network
+    import aiohttp
+
+    max_bytes = ParseLimits.from_settings().max_bytes
+
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
@@ -77,7 +108,16 @@ async def fetch_html_content(url: str) -> str:
         async with aiohttp.ClientSession() as session:
             async with session.get(url, headers=headers, timeout=30) as response:
                 if response.status  in [200, 201, 202]:
-                    return await response.text()
+                    # read at most one byte past the limit; the extractor cuts the page to
+                    # MAX_HTML_BYTES and reports it as truncated, so huge bodies never sit in memory
+                    body = await read_body(response, max_bytes + 1 if max_bytes else 0)
+                    page = FetchedPage(
+                        html=decode_body(body, response.charset),
+                        url=str(response.url),
+                        redirects=[str(r.url) for r in response.history],
+                    )
+                    cache.set_json(cache_key, dataclasses.asdict(page), ttl=cache_ttl("page"))
+                    return page
                 else:
                     raise HTTPException(
                         status_code=400,
@@ -89,13 +129,25 @@ async def fetch_html_content(url: str) -> str:
         raise HTTPException(status_code=408, detail="Request timeout")
 
 
-@router.post("/analyze/url", response_model=AnalysisResponse)
-async def analyze_url(request: Request, response: Response, url: Optional[str] = Form(None)):
+async def fetch_html_content(url: str) -> str:
     """
-    Analyze a webpage by URL - accepts url from form-data, JSON body, or query param.
+    Fetch HTML content from a URL (see fetch_page)
+    """
+    return (await fetch_page(url)).html
+
+
+async def resolve_analysis_request(request: Request, url: Optional[str], fields: Optional[str],
+                                   default_fields: Optional[Iterable[str]] = None,
+                                   enrich: Optional[str] = None) -> Tuple[str, List[str], List[str]]:
+    """
+    Resolve the URL, field selection and explicit enrichers of an analysis request from
+    form-data, JSON body or query params (no or blank fields selects default_fields, or
+    else every field). Raises HTTPException(status_code=422) when one is invalid.
     """
     # Try form field first (used by the HTML form)
     resolved_url = url
+    requested_fields = fields
+    requested_enrich = enrich
 
     # If not provided via form, try JSON body (browser extension)
     if not resolved_url:
@@ -103,6 +155,8 @@ async def analyze_url(request: Request, response: Response, url: Optional[str] =
             payload = await request.json()
             if isinstance(payload, dict):
                 resolved_url = payload.get("url")
+                requested_fields = requested_fields or payload.get("fields")
+                requested_enrich = requested_enrich or payload.get("enrich")
         except Exception:
             # ignore JSON parse errors, we'll try query params next
             resolved_url = resolved_url
@@ -110,6 +164,10 @@ async def analyze_url(request: Request, response: Response, url: Optional[str] =
     # If still not found, try query params
     if not resolved_url:
         resolved_url = request.query_params.get("url")
+    if not requested_fields:
+        requested_fields = request.query_params.get("fields")
+    if not requested_enrich:
+        requested_enrich = request.query_params.get("enrich")
 
     # Normalize and validate the resolved URL (raises HTTPException on failure)
     try:
@@ -128,18 +186,131 @@ async def analyze_url(request: Request, response: Response, url: Optional[str] =
             "input": None
         }])
 
+    # an empty form field (fields=) means no selection
+    if isinstance(requested_fields, str) and not requested_fields.strip():
+        requested_fields = None
+    try:
+        selected_fields = resolve_fields(requested_fields or default_fields)
+        selected_enrich = resolve_enrichers(requested_enrich)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return resolved_url, selected_fields, selected_enrich
+
+
+def page_canonical(aliases: AliasMap, requested_url: str, page: Optional[FetchedPage],
+                   extractor: MetaTagExtractor) -> Tuple[str, List[str]]:
+    """
+    The canonical URL of an analyzed page and the URLs it was reached by (the fetched URL,
+    the requested URL and the redirect chain). The page's declared canonical URL is used
+    when it is trusted (see trusted_canonical), the canonicalized fetched URL otherwise.
+    """
+    fetched_url = page.url if page else requested_url
+    page_urls = [fetched_url, requested_url] + (page.redirects if page else [])
+    canonical_url = (trusted_canonical(extractor.canonical_url, page_urls, aliases)
+                     or canonicalize_url(fetched_url))
+    return canonical_url, page_urls
+
+
+def record_analysis(aliases: AliasMap, analyses: AnalysisCache, requested_url: str, page: Optional[FetchedPage],
+                    extractor: MetaTagExtractor, meta: dict) -> str:
+    """
+    Cache an analysis under its canonical URL (see page_canonical) and map the requested
+    URL, the fetched URL and the redirect chain to it. Returns the canonical URL.
+    """
+    canonical_url, page_urls = page_canonical(aliases, requested_url, page, extractor)
+    aliases.record(canonical_url, page_urls)
+    analyses.set(canonical_url, meta, extractor.computed_fields, extractor.truncated, extractor.enriched)
+    return canonical_url
+
+
+def cached_meta(cached: dict, requested_url: str, selected_fields: List[str]) -> dict:
+    """The meta of a cached analysis as an answer to requested_url: its `url` is the URL
+    that was requested, as for a fresh analysis, not the one first analyzed (which may
+    have been a tracking or AMP variant)."""
+    meta = cached["meta"]
+    if "url" in selected_fields:
+        meta["url"] = requested_url
+    return meta
+
+
+@router.post("/analyze/url", response_model=AnalysisResponse)
+async def analyze_url(request: Request, response: Response, url: Optional[str] = Form(None),
+                      fields: Optional[str] = Form(None), enrich: Optional[str] = Form(None)):
+    """
+    Analyze a webpage by URL - accepts url from form-data, JSON body, or query param.
+    An optional `fields` parameter (comma separated, or a list in JSON) limits the
+    analysis to those MetaTagData fields; `enrich=datacite` applies DataCite metadata to
+    them even when `doi` isn't one of them.
+    """
+    resolved_url, selected_fields, selected_enrich = await resolve_analysis_request(request, url, fields,
+                                                                                    enrich=enrich)
+    enrichers = enrichers_for(selected_fields, selected_enrich)
+
+    # Opt-in profiling (?profile=1 for stage timings, ?profile=stacks to add sampled stacks)
+    profile_mode = request.query_params.get("profile")
+    want_profile = bool(profile_mode) and profile_mode.lower() not in ("0", "false")
+    if want_profile and not profiling_allowed(request.headers.get("X-Profile-Token")):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    sampled = not want_profile and should_sample()
+
     # add fallback CORS headers on the actual response (in case global CORS middleware isn't active)
     response.headers["Access-Control-Allow-Origin"] = "*"
     response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
     response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
     logger.info(f"Analyzing URL: {resolved_url}")
-    html_content = await fetch_html_content(resolved_url)
 
-    extractor = MetaTagExtractor()
-    meta_tags = await extractor.extract(html_content, resolved_url)
+    timer = StageTimer()
+    cache = get_cache()
+    aliases = AliasMap(cache)
+    analyses = AnalysisCache(cache)
+
+    # any alias we've seen before (tracking/AMP variants, redirect sources, ...) resolves
+    # to its canonical URL; a cached analysis for that is served without fetching
+    with timer.stage("cache"):
+        canonical_url = aliases.resolve(resolved_url)
+        cached = analyses.get(canonical_url, selected_fields, enrichers)
+
+    sampler = SamplingProfiler().start() if sampled or (want_profile and profile_mode == "stacks") else None
+    try:
+        if cached is not None:
+            raw_meta_tags = json.dumps(cached_meta(cached, resolved_url, selected_fields), ensure_ascii=False)
+            computed_fields = cached["computed_fields"]
+            truncated = cached.get("truncated")
+        else:
+            # the page is only fetched when a requested field is extracted from it
+            page = None
+            if needs_html(selected_fields):
+                with timer.stage("fetch"):
+                    page = await fetch_page(resolved_url)
+
+            extractor = MetaTagExtractor()
+            meta_tags = await extractor.extract(page.html if page else None, resolved_url, timer=timer,
+                                                fields=selected_fields, enrich=selected_enrich)
+
+            # call the instance method instead of the standalone function
+            with timer.stage("serialize"):
+                raw_meta_tags = extractor.convert_to_json(meta_tags)
+            computed_fields = extractor.computed_fields
+            truncated = extractor.truncated
 
-    # call the instance method instead of the standalone function
-    print(extractor.convert_to_json(meta_tags))
+            with timer.stage("cache"):
+                canonical_url = record_analysis(aliases, analyses, resolved_url, page, extractor,
+                                                json.loads(raw_meta_tags))
+    finally:
+        if sampler:
+            sampler.stop()
+    print(raw_meta_tags)
+
+    profile = None
+    if want_profile or sampled:
+        profile = timer.as_dict()
+        stacks = sampler.collapsed() if sampler else None
+        if sampled:
+            # background samples are written to PROFILE_DIR, not returned to the client
+            write_profile(resolved_url, profile, stacks)
+            profile = None
+        elif stacks is not None:
+            profile["collapsed_stacks"] = stacks
 
     results = {"analysis_id": "placeholder_id", "confidence": 0.95, "status": "completed", "results": {}}
     return AnalysisResponse(
@@ -148,5 +319,191 @@ async def analyze_url(request: Request, response: Response, url: Optional[str] =
         results=results["results"],
         confidence=results["confidence"],
         processed_at=datetime.utcnow().isoformat(),
-        raw_meta_tags= extractor.convert_to_json(meta_tags)
-    )
\ No newline at end of file
+        raw_meta_tags=raw_meta_tags,
+        computed_fields=computed_fields,
+        truncated=truncated,
+        canonical_url=canonical_url,
+        cached=cached is not None,
+        profile=profile
+    )
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+_enrichment_executor: Optional[ThreadPoolExecutor] = None
+_enrichment_executor_lock = threading.Lock()
+
+
+def get_enrichment_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for enricher lookups, kept apart from the default executor so
+    lookups that outlive their timeout cannot hold up page parsing."""
+    global _enrichment_executor
+    if _enrichment_executor is None:
+        with _enrichment_executor_lock:
+            if _enrichment_executor is None:
+                _enrichment_executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(setting("ENRICHMENT_WORKERS", 8))), thread_name_prefix="enricher")
+    return _enrichment_executor
+
+
+def _run_enricher(extractor: MetaTagExtractor, name: str, meta, url: str):
+    # each enricher works on its own copy so the fields it changed can be diffed out
+    enriched = copy.deepcopy(meta)
+    if not getattr(extractor, ENRICHERS[name])(enriched, url):
+        raise RuntimeError("lookup failed")
+    return enriched
+
+
+async def stream_enrichment(extractor: MetaTagExtractor, meta, page: Optional[FetchedPage], requested_url: str,
+                            selected_fields: List[str], timeout: float, selected_enrich: List[str] = ()):
+    """
+    Yield the locally extracted fields as a `meta` event, then one `patch` event per enricher
+    (with the fields it changed, or status "timeout"/"error") as it finishes, then `done`.
+    The analysis is cached once every enricher has finished in time.
+    """
+    cache = get_cache()
+    aliases = AliasMap(cache)
+    # the same trusted, canonicalized URL /analyze/url reports (not the raw <link rel=canonical>)
+    canonical_url, _ = page_canonical(aliases, requested_url, page, extractor)
+    pending = extractor.pending_enrichers(meta, selected_fields, selected_enrich)
+    base = json.loads(extractor.convert_to_json(mask_fields(copy.deepcopy(meta), selected_fields)))
+    yield sse_event("meta", {
+        "meta": base,
+        "computed_fields": extractor.computed_fields,
+        "truncated": extractor.truncated,
+        "canonical_url": canonical_url,
+        "cached": False,
+        "pending": pending,
+    })
+
+    # the enrichers block on requests/DNS, so they run side by side in their own bounded pool;
+    # their HTTP requests give up after the same timeout, which frees the thread again
+    extractor.request_timeout = timeout
+    loop = asyncio.get_running_loop()
+    executor = get_enrichment_executor()
+    tasks = {loop.run_in_executor(executor, _run_enricher, extractor, name, meta, requested_url): name
+             for name in pending}
+    result = dict(base)
+    incomplete = []
+    deadline = loop.time() + timeout
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                name = tasks.pop(task)
+                try:
+                    enriched = json.loads(extractor.convert_to_json(mask_fields(task.result(), selected_fields)))
+                except Exception as e:
+                    logger.warning(f"{name} enrichment failed for {requested_url}: {e}")
+                    incomplete.append(name)
+                    yield sse_event("patch", {"enricher": name, "status": "error", "fields": {}})
+                    continue
+                changed = {k: v for k, v in enriched.items() if v != base.get(k)}
+                result.update(changed)
+                yield sse_event("patch", {"enricher": name, "status": "ok", "fields": changed})
+        for name in tasks.values():
+            incomplete.append(name)
+            yield sse_event("patch", {"enricher": name, "status": "timeout", "fields": {}})
+    finally:
+        # stop waiting on enrichers the client no longer needs (running lookups end at their request timeout)
+        for task in tasks:
+            task.cancel()
+
+    if not incomplete:
+        extractor.enriched = enrichers_for(selected_fields, selected_enrich)
+        canonical_url = record_analysis(aliases, AnalysisCache(cache), requested_url, page, extractor, result)
+    yield sse_event("done", {"status": "completed", "canonical_url": canonical_url, "incomplete": incomplete})
+
+
+@router.get("/analyze/url/stream")
+@router.post("/analyze/url/stream")
+async def analyze_url_stream(request: Request, url: Optional[str] = Form(None), fields: Optional[str] = Form(None),
+                             enrich: Optional[str] = Form(None)):
+    """
+    Streaming variant of /analyze/url (server-sent events): the fields extracted from the
+    page itself are sent first, then the DataCite/IPQualityScore enrichment as patches as
+    each lookup finishes or times out (ENRICHMENT_TIMEOUT seconds). GET is supported for
+    EventSource clients.
+    """
+    resolved_url, selected_fields, selected_enrich = await resolve_analysis_request(request, url, fields,
+                                                                                    enrich=enrich)
+    logger.info(f"Analyzing URL (stream): {resolved_url}")
+    headers = {
+        "Cache-Control": "no-cache",
+        # keep reverse proxies from buffering the events
+        "X-Accel-Buffering": "no",
+        "Access-Control-Allow-Origin": "*",
+    }
+
+    cache = get_cache()
+    canonical_url = AliasMap(cache).resolve(resolved_url)
+    cached = AnalysisCache(cache).get(canonical_url, selected_fields, enrichers_for(selected_fields, selected_enrich))
+    if cached is not None:
+        async def replay():
+            yield sse_event("meta", {
+                "meta": cached_meta(cached, resolved_url, selected_fields),
+                "computed_fields": cached["computed_fields"],
+                "truncated": cached.get("truncated"),
+                "canonical_url": canonical_url,
+                "cached": True,
+                "pending": [],
+            })
+            yield sse_event("done", {"status": "completed", "canonical_url": canonical_url, "incomplete": []})
+        return StreamingResponse(replay(), media_type="text/event-stream", headers=headers)
+
+    # fetch errors still surface as regular HTTP errors, before the stream starts
+    page = await fetch_page(resolved_url) if needs_html(selected_fields) else None
+    extractor = MetaTagExtractor()
+    meta = await extractor.extract_local_async(page.html if page else None, resolved_url, fields=selected_fields,
+                                               enrich=selected_enrich)
+    timeout = float(setting("ENRICHMENT_TIMEOUT", 10))
+    return StreamingResponse(stream_enrichment(extractor, meta, page, resolved_url, selected_fields, timeout,
+                                               selected_enrich),
+                             media_type="text/event-stream", headers=headers)
+
+
+@router.get("/analyze/site")
+@router.post("/analyze/site")
+async def analyze_site(request: Request, url: Optional[str] = Form(None), fields: Optional[str] = Form(None),
+                       fetch_missing: bool = Form(False), limit: Optional[int] = Form(None, ge=1)):
+    """
+    Site mode: metadata for the entries of a site's sitemaps and RSS/Atom feeds, as JSON
+    lines (one MetaTagData object per line). `url` is the domain or any URL on the site.
+    Without `fields` only what feeds provide is returned (FEED_FIELDS); with
+    `fetch_missing`, entries lacking a requested field have their page fetched for it.
+    `limit` (1 to SITE_MAX_ENTRIES) caps the number of entries.
+    """
+    resolved_url, selected_fields, _ = await resolve_analysis_request(request, url, fields, default_fields=FEED_FIELDS)
+    fetch_missing = fetch_missing or request.query_params.get("fetch_missing", "").lower() in ("1", "true")
+    limits = SiteLimits.from_settings()
+    limit = limit if limit is not None else request.query_params.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="limit must be an integer")
+        # a request may ask for fewer entries than configured, never for more
+        if not 1 <= limit <= limits.max_entries:
+            raise HTTPException(status_code=422, detail=f"limit must be between 1 and {limits.max_entries}")
+        limits.max_entries = limit
+
+    logger.info(f"Analyzing site: {resolved_url}")
+    crawler = SiteCrawler(resolved_url, fields=selected_fields, fetch_page=fetch_page,
+                          fetch_missing=fetch_missing, limits=limits)
+    sitemaps, feeds = await crawler.discover()
+
+    async def lines():
+        async for meta in crawler.entries():
+            yield crawler.extractor.convert_to_json(meta, indent=None) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={
+        "Access-Control-Allow-Origin": "*",
+        "X-Sitemaps": str(len(sitemaps)),
+        "X-Feeds": str(len(feeds)),
+    })
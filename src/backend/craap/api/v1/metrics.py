@@ -5,6 +5,8 @@ from datetime import datetime
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
+from src.backend.craap.processing.rules import get_extraction_rules, shared_rule_stats
+
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
@@ -21,6 +23,24 @@ async def health_check():
             status_code=500,
             content={"status": "unhealthy", "error": str(e)}
         )
+
+@router.get("/metrics")
+async def metrics():
+    """How often each extraction profile rule was tried and matched, summed over the workers"""
+    rules = get_extraction_rules()
+    stats, workers = shared_rule_stats(rules) if rules else ([], [])
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "extraction_rules": {
+            "profiles": len(rules) if rules else 0,
+            # worker processes whose counters are included
+            "workers": workers,
+            # rules that were tried but never matched are listed first
+            "rules": stats,
+        },
+    }
+
+
 @router.get("/")
 async def root():
     return {
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Microbenchmark for date normalization (processing/dates.py).
+
+Builds a synthetic corpus of date strings as publishers write them: each of
+``--domains`` sites uses one or two formats, picked with weights that favour ISO 8601
+as found in meta tags (ISO dates and timestamps, RFC 822 from
+feeds, "March 1, 2024", "1 March 2024", "2024/03/01", "03/01/2024", ctime, and some
+left to dateutil). It parses the corpus with ``DateNormalizer`` (per-domain format learning
+included) and a sample with plain ``dateutil.parser.parse``, and reports the time per
+date and how each string was handled.
+
+Before timing anything it checks ``DateNormalizer.normalize`` against a table of fixed
+cases (``CASES``: reduced-precision ISO dates, DataCite ranges, RFC 822, am/pm times,
+strings that aren't dates) and that DataCite dates it can't parse are kept as published.
+
+Exits with a non-zero status when a case gives the wrong result, when any string parses
+differently from dateutil, or when the speedup over dateutil is below ``--min-speedup``.
+
+Usage (from the repository root):
+    python -m src.backend.craap.bench.dates --count 200000 --min-speedup 5
+    python -m src.backend.craap.bench.dates --cases-only
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from src.backend.craap.processing.dates import DateNormalizer
+from src.backend.craap.processing.extractor import MetaTagExtractor
+from src.backend.craap.model.data_model import MetaTagData
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+               'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def _ordinal(day: int) -> str:
+    suffix = 'th' if 11 <= day <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f'{day}{suffix}'
+
+
+def _hour12(dt: datetime) -> str:
+    return f"{(dt.hour % 12) or 12}:{dt.minute:02d} {'PM' if dt.hour >= 12 else 'AM'}"
+
+
+# (name, weight, render): weights follow what pages carry, mostly ISO 8601 in meta tags
+FORMATS: List[Tuple[str, int, Callable[[datetime], str]]] = [
+    ('iso_date', 10, lambda d: d.strftime('%Y-%m-%d')),
+    ('iso_utc', 10, lambda d: d.strftime('%Y-%m-%dT%H:%M:%SZ')),
+    ('iso_offset', 10, lambda d: d.strftime('%Y-%m-%dT%H:%M:%S') + '+02:00'),
+    ('iso_micro', 5, lambda d: d.strftime('%Y-%m-%dT%H:%M:%S.%f') + '-05:00'),
+    ('iso_space', 5, lambda d: d.strftime('%Y-%m-%d %H:%M:%S')),
+    ('rfc822_gmt', 5, lambda d: d.strftime('%a, %d %b %Y %H:%M:%S GMT')),
+    ('rfc822_offset', 3, lambda d: d.strftime('%a, %d %b %Y %H:%M:%S +0100')),
+    ('month_day_year', 3, lambda d: f"{MONTH_NAMES[d.month - 1]} {d.day}, {d.year}"),
+    ('abbr_month_time', 2, lambda d: f"{MONTH_NAMES[d.month - 1][:3]} {d.day}, {d.year} {_hour12(d)}"),
+    ('long_weekday', 1, lambda d: f"{DAY_NAMES[d.weekday()]}, {MONTH_NAMES[d.month - 1]} {_ordinal(d.day)}, "
+                                  f"{d.year} at {_hour12(d)}"),
+    ('day_month_year', 3, lambda d: f"{d.day} {MONTH_NAMES[d.month - 1]} {d.year}"),
+    ('slash_ymd', 2, lambda d: d.strftime('%Y/%m/%d')),
+    ('dot_ymd_time', 1, lambda d: d.strftime('%Y.%m.%d %H:%M')),
+    ('us_numeric', 2, lambda d: d.strftime('%m/%d/%Y')),
+    ('eu_numeric_time', 1, lambda d: d.strftime('%d/%m/%Y %H:%M') if d.day > 12 else d.strftime('%m/%d/%Y %H:%M')),
+    ('ctime', 1, lambda d: d.strftime('%a %b %d %H:%M:%S %Y')),
+    # left to dateutil
+    ('month_year', 1, lambda d: d.strftime('%B %Y')),
+    ('two_digit_year', 1, lambda d: d.strftime('%d-%b-%y')),
+]
+
+
+# (input, expected normalize() result)
+CASES: List[Tuple[str, Optional[str]]] = [
+    # reduced precision is kept, not filled in with today's month and day
+    ('2024', '2024'),
+    ('2024-03', '2024-03'),
+    ('2024-03-01', '2024-03-01T00:00:00'),
+    ('2024-03-01T10:00:00Z', '2024-03-01T10:00:00+00:00'),
+    # DataCite ranges normalize to their start; a slash date is not a range
+    ('2020-01-01/2020-12-31', '2020-01-01T00:00:00'),
+    ('2020/2021', '2020'),
+    ('2024/03/01', '2024-03-01T00:00:00'),
+    ('03/01/2024', '2024-03-01T00:00:00'),
+    ('25/12/2024', '2024-12-25T00:00:00'),
+    # RFC 822 (feeds)
+    ('Fri, 01 Mar 2024 10:00:00 GMT', '2024-03-01T10:00:00+00:00'),
+    ('Fri, 01 Mar 2024 10:00:00 +0100', '2024-03-01T10:00:00+01:00'),
+    ('1 March 2024', '2024-03-01T00:00:00'),
+    # am/pm, including 12 AM and 12 PM
+    ('March 1, 2024 10:05 PM', '2024-03-01T22:05:00'),
+    ('Mar 1, 2024 12:30 AM', '2024-03-01T00:30:00'),
+    ('Friday, March 1st, 2024 at 12:00 PM', '2024-03-01T12:00:00'),
+    ('Fri Mar  1 10:00:00 2024', '2024-03-01T10:00:00'),
+    ('Spring 2019', None),
+    ('not a date', None),
+    ('', None),
+]
+
+# (DataCite date, expected publication_date): what normalize() can't parse is kept as published
+DATACITE_CASES: List[Tuple[str, str]] = [
+    ('2019-05', '2019-05'),
+    ('2020-01-01/2020-12-31', '2020-01-01T00:00:00'),
+    ('Spring 2019', 'Spring 2019'),
+]
+
+
+def check_cases() -> List[str]:
+    """Failures of CASES (each tried twice, so the learned-format path runs too) and DATACITE_CASES."""
+    failures = []
+    normalizer = DateNormalizer()
+    for _ in range(2):
+        for text, expected in CASES:
+            got = normalizer.normalize(text, 'cases.example')
+            if got != expected:
+                failures.append(f"normalize({text!r}) = {got!r}, expected {expected!r}")
+    extractor = MetaTagExtractor()
+    for date, expected in DATACITE_CASES:
+        meta = MetaTagData()
+        extractor.apply_datacite_attributes(meta, {'dates': [{'date': date, 'dateType': 'Issued'}]}, '')
+        if meta.publication_date != expected:
+            failures.append(f"DataCite date {date!r} gave {meta.publication_date!r}, expected {expected!r}")
+    return failures
+
+
+def build_corpus(count: int, domains: int, seed: int) -> List[Tuple[str, str]]:
+    """(domain, date string) pairs; every domain sticks to one or two formats."""
+    rng = random.Random(seed)
+    weights = [weight for _, weight, _ in FORMATS]
+    site_formats = [rng.choices(FORMATS, weights, k=rng.choice((1, 1, 2))) for _ in range(domains)]
+    start = datetime(2000, 1, 1)
+    corpus = []
+    for _ in range(count):
+        site = rng.randrange(domains)
+        _, _, render = rng.choice(site_formats[site])
+        moment = start + timedelta(seconds=rng.randrange(30 * 365 * 86400))
+        corpus.append((f'site{site}.example', render(moment)))
+    return corpus
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark date normalization against dateutil")
+    parser.add_argument('--count', type=int, default=200_000, help='Date strings in the corpus')
+    parser.add_argument('--domains', type=int, default=500, help='Distinct publisher domains')
+    parser.add_argument('--sample', type=int, default=20_000, help='Strings timed with plain dateutil')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--min-speedup', type=float, default=5.0, help='Required speedup over dateutil')
+    parser.add_argument('--cases-only', action='store_true', help='Only check the fixed cases')
+    args = parser.parse_args(argv)
+
+    failures = check_cases()
+    checked = 2 * len(CASES) + len(DATACITE_CASES)
+    print(f"cases: {checked - len(failures)}/{checked} as expected")
+    if args.cases_only:
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        return 1 if failures else 0
+
+    import dateutil.parser
+
+    corpus = build_corpus(args.count, args.domains, args.seed)
+    normalizer = DateNormalizer(max_domains=max(args.domains, 1))
+
+    start = time.perf_counter()
+    results = [normalizer.parse(text, domain) for domain, text in corpus]
+    fast_us = (time.perf_counter() - start) / len(corpus) * 1e6
+
+    sample = corpus[:args.sample]
+    start = time.perf_counter()
+    expected = [dateutil.parser.parse(text) for _, text in sample]
+    dateutil_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    mismatches = [(text, _iso(got), _iso(want))
+                  for (_, text), got, want in zip(sample, results, expected) if _iso(got) != _iso(want)]
+    # the strings outside the timed sample are checked too
+    for (_, text), got in zip(corpus[args.sample:], results[args.sample:]):
+        want = dateutil.parser.parse(text)
+        if _iso(got) != _iso(want):
+            mismatches.append((text, _iso(got), _iso(want)))
+
+    speedup = dateutil_us / fast_us if fast_us else float('inf')
+    print(f"corpus: {len(corpus)} strings, {args.domains} domains, {len(FORMATS)} formats")
+    print(f"dateutil:       {dateutil_us:8.2f} us per date")
+    print(f"DateNormalizer: {fast_us:8.2f} us per date ({speedup:.1f}x)")
+    print("paths: " + ", ".join(f"{path} {n / len(corpus):.1%}" for path, n in normalizer.stats.items()))
+
+    if mismatches:
+        failures.append(f"{len(mismatches)} strings parsed differently from dateutil, e.g. "
+                        + "; ".join(f"{t!r}: {g} != {w}" for t, g, w in mismatches[:3]))
+    if speedup < args.min_speedup:
+        failures.append(f"speedup {speedup:.1f}x is below {args.min_speedup}x")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Load-test driver for ``POST /analyze/url``.
+
+Starts the synthetic origin server (bench/origin.py) and the API under uvicorn, with
+DataCite and IPQualityScore pointed at the origin's stand-ins, then ramps the number of
+concurrent clients through ``--levels``. Each level runs closed-loop clients for
+``--duration`` seconds, every request asking for a distinct page so caches don't hide
+the work. For each level it reports throughput, latency percentiles and error rate, and
+finally the saturation point: the last level before throughput stopped growing (by at
+least ``--min-gain``) or the error rate went over ``--max-error-rate``.
+
+Usage (from the repository root):
+    python -m src.backend.craap.bench.load --levels 1,2,4,8,16,32 --duration 10 --workers 2
+    python -m src.backend.craap.bench.load --target http://127.0.0.1:10124 --origin http://127.0.0.1:8900
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import subprocess
+import sys
+import time
+import urllib.request
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+from src.backend.craap.bench.startup import APP_MODULE, child_env, free_port
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{proc.args[2]} exited with status {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def _spawn(stack: ExitStack, args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, "-m"] + args, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def _stop():
+        proc.terminate()
+        proc.wait()
+
+    stack.callback(_stop)
+    return proc
+
+
+async def run_level(target: str, origin: str, concurrency: int, duration: float,
+                    fields: Optional[str], counter: itertools.count, timeout: float) -> dict:
+    """Run `concurrency` closed-loop clients for `duration` seconds and summarize the results."""
+    import aiohttp
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def client(session):
+        while time.perf_counter() < deadline:
+            data = {"url": f"{origin}/page/{next(counter)}"}
+            if fields:
+                data["fields"] = fields
+            start = time.perf_counter()
+            try:
+                async with session.post(f"{target}/analyze/url", data=data) as resp:
+                    await resp.read()
+                    status = resp.status
+            except Exception as e:
+                status = type(e).__name__
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies) + sum(errors.values())
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else None,
+        "error_rate": sum(errors.values()) / total if total else 0.0,
+        "errors": errors,
+    }
+
+
+def find_saturation(results: List[dict], min_gain: float, max_error_rate: float) -> Optional[dict]:
+    """Last level before throughput stopped growing by min_gain or errors exceeded max_error_rate."""
+    best = None
+    for result in results:
+        if result["error_rate"] > max_error_rate:
+            break
+        if best is not None and result["throughput_rps"] < best["throughput_rps"] * (1 + min_gain):
+            break
+        best = result
+    return best
+
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:8.1f}" if value is not None else "       -"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ramp concurrency against /analyze/url and report latency percentiles")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--fields", help="fields= parameter sent with every request")
+    parser.add_argument("--target", help="Base URL of a running API (default: start one)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the API")
+    parser.add_argument("--cache", default="none", help="CACHE_BACKEND for the started API")
+    parser.add_argument("--origin", help="Base URL of a running origin (default: start bench/origin.py)")
+    parser.add_argument("--size", type=int, default=50_000, help="Origin page size in bytes")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Origin page latency")
+    parser.add_argument("--richness", type=int, default=2, help="Origin metadata richness (0-3)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Origin error rate")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="Throughput gain that still counts as scaling")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate that counts as saturated")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    results = []
+    with ExitStack() as stack:
+        origin = args.origin
+        if not origin:
+            port = free_port()
+            origin = f"http://127.0.0.1:{port}"
+            proc = _spawn(stack, [
+                "src.backend.craap.bench.origin", "--port", str(port), "--size", str(args.size),
+                "--latency-ms", str(args.latency_ms), "--richness", str(args.richness),
+                "--error-rate", str(args.error_rate),
+            ], child_env())
+            _wait_ready(f"{origin}/page/ready?error_rate=0", proc)
+
+        target = args.target
+        if not target:
+            port = free_port()
+            target = f"http://127.0.0.1:{port}"
+            env = child_env()
+            env.update({
+                "CRAAP_CACHE_BACKEND": args.cache,
+                "CRAAP_DATACITE_API_URL": origin,
+                "CRAAP_IPQS_API_URL": f"{origin}/api/json/ip",
+                "ipqualityscore_api_key": "bench",
+            })
+            proc = _spawn(stack, [
+                "uvicorn", f"{APP_MODULE}:app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ], env)
+            _wait_ready(f"{target}/ping", proc)
+
+        counter = itertools.count()
+        print(f"{'conc':>5} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+        for level in levels:
+            result = asyncio.run(run_level(target, origin, level, args.duration, args.fields, counter, args.timeout))
+            results.append(result)
+            print(f"{level:5d} {result['requests']:7d} {result['throughput_rps']:8.1f} {_fmt(result['p50_ms'])} "
+                  f"{_fmt(result['p90_ms'])} {_fmt(result['p99_ms'])} {_fmt(result['max_ms'])} "
+                  f"{result['error_rate']:7.1%}")
+
+    saturation = find_saturation(results, args.min_gain, args.max_error_rate)
+    if saturation:
+        print(f"saturation point: ~{saturation['concurrency']} concurrent clients, "
+              f"{saturation['throughput_rps']:.1f} req/s (p99 {_fmt(saturation['p99_ms']).strip()} ms)")
+    else:
+        print("saturation point: below the first level")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"levels": results, "saturation": saturation}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
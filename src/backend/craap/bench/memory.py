@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Memory regression check for the extractor on huge and hostile pages.
+
+Each synthetic page is extracted under tracemalloc and the peak memory allocated
+during the extraction (the input string itself is allocated beforehand and not
+counted) is compared with a per-page budget. Each page is also extracted once more
+without tracemalloc (which slows Python down several times) and the wall time is
+compared with MAX_PARSE_SECONDS plus ``--slack-seconds`` (the field being extracted when
+the budget runs out is finished). Exits non-zero when any page exceeds a budget.
+
+Usage (from the repository root):
+    python -m src.backend.craap.bench.memory --budget-mb 128 --slack-seconds 1
+"""
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from src.backend.craap.processing.cache import NullCache, set_cache
+from src.backend.craap.processing.extractor import HTML_FIELD_EXTRACTORS, MetaTagExtractor
+from src.backend.craap.processing.limits import ParseLimits
+
+_HEAD = (
+    '<html lang="en"><head><title>Benchmark page</title>'
+    '<meta name="author" content="Jane Doe, John Roe">'
+    '<meta property="article:published_time" content="2024-03-01T10:00:00Z">'
+    '<meta name="description" content="Synthetic page">'
+    '</head><body>'
+)
+_TAIL = '</body></html>'
+
+
+def typical_page() -> str:
+    return _HEAD + '<article>' + '<p>Some article text, nothing hostile here.</p>' * 300 + '</article>' + _TAIL
+
+
+def large_text_page(size: int = 20_000_000) -> str:
+    paragraph = '<p>' + 'lorem ipsum dolor sit amet ' * 400 + '</p>'
+    return _HEAD + paragraph * (size // len(paragraph)) + _TAIL
+
+
+def many_nodes_page(nodes: int = 500_000) -> str:
+    return _HEAD + '<span>x</span>' * nodes + _TAIL
+
+
+def deep_nesting_page(depth: int = 100_000) -> str:
+    return _HEAD + '<div>' * depth + 'deep' + '</div>' * depth + _TAIL
+
+
+def huge_attribute_page(size: int = 10_000_000) -> str:
+    return _HEAD.replace('Synthetic page', 'x' * size) + '<p>tail</p>' + _TAIL
+
+
+PAGES: Dict[str, Callable[[], str]] = {
+    'typical': typical_page,
+    'large-text': large_text_page,
+    'many-nodes': many_nodes_page,
+    'deep-nesting': deep_nesting_page,
+    'huge-attribute': huge_attribute_page,
+}
+
+
+def measure(html: str, limits: ParseLimits) -> dict:
+    """Extract all HTML fields from html and return peak traced memory, duration and truncation."""
+    extractor = MetaTagExtractor(limits=limits)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        asyncio.run(extractor.extract(html, 'https://bench.invalid/page', fields=list(HTML_FIELD_EXTRACTORS)))
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_mb': peak / 1e6,
+        'retained_mb': retained / 1e6,
+        'truncated': extractor.truncated,
+    }
+
+
+def time_extraction(html: str, limits: ParseLimits) -> float:
+    """Seconds taken to extract all HTML fields from html (untraced)."""
+    extractor = MetaTagExtractor(limits=limits)
+    gc.collect()
+    start = time.perf_counter()
+    asyncio.run(extractor.extract(html, 'https://bench.invalid/page', fields=list(HTML_FIELD_EXTRACTORS)))
+    return time.perf_counter() - start
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check extractor peak memory per page against a budget")
+    parser.add_argument('--budget-mb', type=float, default=128.0, help='Peak memory budget per page (MB)')
+    parser.add_argument('--retained-mb', type=float, default=1.0, help='Memory allowed to stay allocated after extraction (MB)')
+    parser.add_argument('--slack-seconds', type=float, default=1.0,
+                        help='Time allowed past MAX_PARSE_SECONDS per page (0 skips the time check)')
+    parser.add_argument('--pages', nargs='*', choices=sorted(PAGES), help='Subset of pages to run')
+    args = parser.parse_args(argv)
+
+    # keep the benchmark offline and deterministic: no cache, no enrichment
+    set_cache(NullCache())
+    limits = ParseLimits.from_settings()
+    # warm up first so lazily imported modules (bs4, soupsieve, dateutil) aren't counted
+    asyncio.run(MetaTagExtractor(limits=limits).extract(typical_page(), 'https://bench.invalid/'))
+
+    failures = []
+    for name in args.pages or PAGES:
+        html = PAGES[name]()
+        result = measure(html, limits)
+        seconds = time_extraction(html, limits)
+        del html
+        print(f"{name:15s} peak {result['peak_mb']:8.1f} MB  retained {result['retained_mb']:6.2f} MB  "
+              f"{seconds:6.2f} s  truncated={result['truncated']}")
+        time_budget = limits.max_parse_seconds + args.slack_seconds
+        if limits.max_parse_seconds and args.slack_seconds and seconds > time_budget:
+            failures.append(f"{name}: {seconds:.2f} s exceeds the time budget of {time_budget:.1f} s")
+        if result['peak_mb'] > args.budget_mb:
+            failures.append(f"{name}: peak {result['peak_mb']:.1f} MB exceeds budget {args.budget_mb} MB")
+        if result['retained_mb'] > args.retained_mb:
+            failures.append(f"{name}: {result['retained_mb']:.2f} MB still allocated after extraction")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Synthetic origin server for load tests.
+
+Serves generated article pages plus local stand-ins for the DataCite and
+IPQualityScore APIs, so the API can be load tested without touching the internet:
+
+    GET /page/{id}                    synthetic HTML page
+    GET /dois/{doi}                   DataCite stand-in (point DATACITE_API_URL here)
+    GET /api/json/ip/{key}/{ip}       IPQualityScore stand-in (point IPQS_API_URL at /api/json/ip)
+
+Page size, latency, metadata richness and error rate come from the command line and can
+be overridden per request with the ``size``, ``latency_ms``, ``richness`` and ``error_rate``
+query parameters. Richness levels: 0 = bare page, 1 = title and basic meta tags,
+2 = OpenGraph/article tags and keywords, 3 = everything plus a DOI (which triggers DataCite).
+
+Usage:
+    python -m src.backend.craap.bench.origin --port 8900 --size 50000 --latency-ms 50 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import List, Optional
+
+from aiohttp import web
+
+
+@dataclass
+class OriginConfig:
+    size: int = 50_000
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    richness: int = 2
+    error_rate: float = 0.0
+    enrichment_latency_ms: float = 80.0
+
+
+def render_page(page_id: str, size: int, richness: int) -> str:
+    """Build a synthetic article page of roughly size bytes."""
+    head = [f'<title>Synthetic article {page_id}</title>']
+    if richness >= 1:
+        head += [
+            '<meta name="author" content="Jane Doe, John Roe">',
+            '<meta name="description" content="A synthetic article for load testing">',
+            '<meta name="publisher" content="Bench Publishing">',
+            '<meta http-equiv="content-language" content="en">',
+        ]
+    if richness >= 2:
+        head += [
+            f'<meta property="og:title" content="Synthetic article {page_id}">',
+            '<meta property="article:published_time" content="2024-03-01T10:00:00Z">',
+            '<meta property="article:modified_time" content="2024-03-02T08:30:00Z">',
+            '<meta name="keywords" content="bench, synthetic, load">',
+            f'<link rel="canonical" href="/page/{page_id}">',
+        ]
+    if richness >= 3:
+        head += [
+            f'<meta name="citation_doi" content="10.5555/bench.{page_id}">',
+            '<meta name="generator" content="bench-origin">',
+            '<meta name="robots" content="index, follow">',
+        ]
+    prefix = f'<html lang="en"><head>{"".join(head)}</head><body><article>'
+    suffix = '</article></body></html>'
+    paragraph = '<p>' + 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8 + '</p>'
+    count = max(0, (size - len(prefix) - len(suffix)) // len(paragraph))
+    return prefix + paragraph * count + suffix
+
+
+class Origin:
+    def __init__(self, config: OriginConfig):
+        self.config = config
+
+    def _param(self, request: web.Request, name: str, cast, default):
+        value = request.query.get(name)
+        return cast(value) if value is not None else default
+
+    async def _delay(self, latency_ms: float) -> None:
+        delay = max(0.0, random.gauss(latency_ms, self.config.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def page(self, request: web.Request) -> web.Response:
+        await self._delay(self._param(request, 'latency_ms', float, self.config.latency_ms))
+        if random.random() < self._param(request, 'error_rate', float, self.config.error_rate):
+            return web.Response(status=500, text='synthetic failure')
+        html = render_page(
+            request.match_info['page_id'],
+            self._param(request, 'size', int, self.config.size),
+            self._param(request, 'richness', int, self.config.richness),
+        )
+        return web.Response(text=html, content_type='text/html')
+
+    async def datacite(self, request: web.Request) -> web.Response:
+        await self._delay(self.config.enrichment_latency_ms)
+        doi = request.match_info['doi']
+        return web.json_response({'data': {'attributes': {
+            'doi': doi,
+            'titles': [{'title': f'Dataset {doi}'}],
+            'creators': [{'name': 'Doe, Jane'}, {'givenName': 'John', 'familyName': 'Roe'}],
+            'publisher': 'Bench Data Repository',
+            'publicationYear': 2024,
+            'dates': [{'date': '2024-03-01', 'dateType': 'Issued'}, {'date': '2024-03-05', 'dateType': 'Updated'}],
+            'subjects': [{'subject': 'Benchmarking'}],
+            'types': {'resourceTypeGeneral': 'Dataset'},
+        }}})
+
+    async def ipqs(self, request: web.Request) -> web.Response:
+        await self._delay(self.config.enrichment_latency_ms)
+        return web.json_response({
+            'success': True, 'fraud_score': 0, 'fraudulent': False, 'country_code': 'NL',
+            'ISP': 'Bench ISP', 'ASN': 64512, 'host': request.match_info['ip'],
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/page/{page_id}', self.page)
+        app.router.add_get('/dois/{doi:.+}', self.datacite)
+        app.router.add_get('/api/json/ip/{key}/{ip}', self.ipqs)
+        return app
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = OriginConfig()
+    parser = argparse.ArgumentParser(description="Synthetic origin server with DataCite/IPQualityScore stand-ins")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--size', type=int, default=defaults.size, help='Page size in bytes')
+    parser.add_argument('--latency-ms', type=float, default=defaults.latency_ms, help='Mean page latency')
+    parser.add_argument('--jitter-ms', type=float, default=defaults.jitter_ms, help='Latency standard deviation')
+    parser.add_argument('--richness', type=int, choices=range(4), default=defaults.richness, help='Metadata richness (0-3)')
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate, help='Fraction of pages answered with HTTP 500')
+    parser.add_argument('--enrichment-latency-ms', type=float, default=defaults.enrichment_latency_ms,
+                        help='Mean latency of the DataCite/IPQualityScore stand-ins')
+    args = parser.parse_args(argv)
+
+    config = OriginConfig(
+        size=args.size, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, richness=args.richness,
+        error_rate=args.error_rate, enrichment_latency_ms=args.enrichment_latency_ms,
+    )
+    web.run_app(Origin(config).app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
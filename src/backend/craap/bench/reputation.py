@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Checks and microbenchmark for the local reputation index (processing/reputation_index.py).
+
+First checks ``ReputationIndex.lookup`` against a table of fixed cases (``CASES``) built
+from small list files: nested prefixes in a ``cidr asn`` map and in a blocklist (the
+most specific prefix wins), a listed ASN inside an unlisted one, IPv6 and unlisted
+addresses. Then builds an index from a synthetic ip2asn-sized map (``--ranges`` nested
+IPv4 prefixes) and times the build and the lookups.
+
+Exits with a non-zero status when a case gives the wrong result or a lookup takes
+longer than ``--max-lookup-us`` on average.
+
+Usage (from the repository root):
+    python -m src.backend.craap.bench.reputation --ranges 500000
+    python -m src.backend.craap.bench.reputation --cases-only
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from src.backend.craap.processing.reputation_index import ReputationIndex
+
+BLOCKLIST = """\
+10.0.0.0/8 ; SBL1
+10.2.0.0/16 ; SBL2
+2001:db8::/32 ; SBL3
+"""
+ASN_LIST = "AS200 ; listed\n"
+ASN_MAP = """\
+10.0.0.0/8 100
+10.1.0.0/16 200
+10.1.2.0/24 300
+192.0.2.0/24 100
+192.0.2.128/25 200
+2001:db8::/32 100
+2001:db8:1::/48 200
+"""
+
+# (ip, expected listed, blocklist, ASN)
+CASES: List[Tuple[str, bool, Optional[str], Optional[int]]] = [
+    ('10.0.0.1', True, 'blocklist.txt:SBL1', 100),
+    ('10.1.0.1', True, 'blocklist.txt:SBL1', 200),
+    ('10.1.2.3', True, 'blocklist.txt:SBL1', 300),
+    ('10.1.3.3', True, 'blocklist.txt:SBL1', 200),
+    ('10.2.0.1', True, 'blocklist.txt:SBL2', 100),
+    ('10.3.0.1', True, 'blocklist.txt:SBL1', 100),
+    ('192.0.2.1', False, None, 100),
+    ('192.0.2.200', True, None, 200),
+    ('192.0.3.1', False, None, None),
+    ('2001:db8::1', True, 'blocklist.txt:SBL3', 100),
+    ('2001:db8:1::1', True, 'blocklist.txt:SBL3', 200),
+    ('2001:db9::1', False, None, None),
+]
+
+
+def check_cases() -> List[str]:
+    """Failures of CASES against an index built from BLOCKLIST, ASN_LIST and ASN_MAP."""
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for name, text in (('blocklist.txt', BLOCKLIST), ('asns.txt', ASN_LIST), ('asnmap.txt', ASN_MAP)):
+            paths.append(os.path.join(tmp, name))
+            with open(paths[-1], 'w', encoding='utf-8') as fh:
+                fh.write(text)
+        index = ReputationIndex([paths[0]], [paths[1]], [paths[2]])
+    for ip, listed, blocklist, asn in CASES:
+        got = index.lookup(ip)
+        if (got['listed'], got['blocklist'], got['ASN']) != (listed, blocklist, asn):
+            failures.append(f"lookup({ip!r}) = listed {got['listed']}, blocklist {got['blocklist']!r}, "
+                            f"ASN {got['ASN']}; expected {listed}, {blocklist!r}, {asn}")
+    return failures
+
+
+def write_asn_map(path: str, ranges: int, seed: int) -> None:
+    """An IPv4 ``cidr asn`` map of /16 prefixes, a quarter of them with a /24 nested inside."""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as fh:
+        for i in range(ranges):
+            a, b = 1 + (i >> 16) % 223, (i >> 8) & 255
+            if i % 4:
+                fh.write(f"{a}.{b}.{i & 255}.0/24 {rng.randrange(1, 65536)}\n")
+            else:
+                fh.write(f"{a}.{b}.0.0/16 {rng.randrange(1, 65536)}\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check and benchmark the local reputation index")
+    parser.add_argument('--ranges', type=int, default=500_000, help='Prefixes in the synthetic ASN map')
+    parser.add_argument('--lookups', type=int, default=200_000, help='Lookups to time')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-lookup-us', type=float, default=20.0, help='Allowed average time per lookup')
+    parser.add_argument('--cases-only', action='store_true', help='Only check the fixed cases')
+    args = parser.parse_args(argv)
+
+    failures = check_cases()
+    print(f"cases: {len(CASES) - len(failures)}/{len(CASES)} as expected")
+    if not args.cases_only:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'asnmap.txt')
+            write_asn_map(path, args.ranges, args.seed)
+            start = time.perf_counter()
+            index = ReputationIndex(asn_maps=[path])
+            build_s = time.perf_counter() - start
+        rng = random.Random(args.seed)
+        ips = [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+               for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for ip in ips:
+            index.lookup(ip)
+        lookup_us = (time.perf_counter() - start) / len(ips) * 1e6
+        print(f"index: {args.ranges} prefixes -> {index.stats()['asn_map_ranges']} ranges in {build_s:.2f} s")
+        print(f"lookup: {lookup_us:.2f} us per address")
+        if lookup_us > args.max_lookup_us:
+            failures.append(f"lookup takes {lookup_us:.2f} us, more than {args.max_lookup_us} us")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
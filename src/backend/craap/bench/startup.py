@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark for the API.
+
+Measures, in fresh interpreter processes:
+  - import time of ``src.backend.craap.main`` (and which heavy optional modules it pulls in)
+  - cumulative import time of each of the app's modules (``python -X importtime``)
+  - time from spawning uvicorn until the first successful ``GET /ping``
+
+Exits with a non-zero status when startup regresses: when a module's import time exceeds
+its budget (``MODULE_BUDGETS_MS``, checked by default; override with ``--module-budget``),
+when a measurement exceeds ``--max-import-ms`` / ``--max-ping-ms``, when it is more than
+``--tolerance`` slower than a stored baseline, or when a module that must be imported
+lazily is loaded at startup. A ``--baseline`` file that doesn't exist is an error unless
+``--update-baseline`` is given.
+
+Usage (from the repository root):
+    python -m src.backend.craap.bench.startup
+    python -m src.backend.craap.bench.startup --baseline bench_startup.json --update-baseline
+    python -m src.backend.craap.bench.startup --baseline bench_startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import List, Optional
+
+APP_MODULE = "src.backend.craap.main"
+
+# modules that must only be imported on first use, never at startup
+LAZY_MODULES = ["bs4", "dateutil", "requests", "aiohttp", "dns", "dynaconf", "sqlite3"]
+
+# default cumulative import time budgets (ms) for the app's modules: a few times what they
+# take today, so they hold on a slow machine but catch a heavy dependency imported eagerly
+# (the app module itself is dominated by FastAPI)
+MODULE_BUDGETS_MS = {
+    APP_MODULE: 2000,
+    "src.backend.craap.api.v1.analyzer": 300,
+    "src.backend.craap.api.v1.metrics": 25,
+    "src.backend.craap.processing.feeds": 100,
+    "src.backend.craap.processing.extractor": 60,
+    "src.backend.craap.processing.dates": 25,
+    "src.backend.craap.processing.rules": 25,
+    "src.backend.craap.processing.canonical": 25,
+    "src.backend.craap.processing.cache": 25,
+    "src.backend.craap.processing.limits": 25,
+    "src.backend.craap.processing.reputation_index": 25,
+    "src.backend.craap.processing.profiling": 25,
+    "src.backend.craap.model.data_model": 50,
+    "src.backend.craap.config": 25,
+}
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(runs: int) -> dict:
+    """Import the app in `runs` fresh interpreters; returns the median time and eagerly loaded modules."""
+    timings = []
+    loaded = set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=APP_MODULE, lazy=LAZY_MODULES)],
+            capture_output=True, text=True, check=True, env=child_env(),
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result["ms"])
+        loaded.update(result["loaded"])
+    return {"ms": statistics.median(timings), "loaded": sorted(loaded)}
+
+
+def measure_module_imports(runs: int) -> dict:
+    """Median cumulative import time (ms) of every module imported with the app, from -X importtime."""
+    timings = {}
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {APP_MODULE}"],
+            capture_output=True, text=True, check=True, env=child_env(),
+        )
+        for line in out.stderr.splitlines():
+            # "import time:       self [us] |  cumulative | imported package"
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                timings.setdefault(name.strip(), []).append(int(cumulative) / 1000)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def parse_budget(value: str) -> tuple:
+    module, sep, ms = value.partition("=")
+    try:
+        if not sep:
+            raise ValueError
+        return module.strip(), float(ms)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected MODULE=MS, got {value!r}")
+
+
+def free_port() -> int:
+    """Return a TCP port on 127.0.0.1 that is free right now."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def child_env() -> dict:
+    """Environment for child processes, with the repository root on PYTHONPATH."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    return env
+
+
+def measure_first_ping(runs: int, timeout: float = 30.0) -> float:
+    """Median time (ms) from spawning uvicorn to the first successful GET /ping."""
+    timings = []
+    for _ in range(runs):
+        port = free_port()
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"{APP_MODULE}:app", "--host", "127.0.0.1",
+             "--port", str(port), "--log-level", "warning"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=child_env(),
+        )
+        try:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {proc.returncode}")
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"/ping did not answer within {timeout}s")
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1) as resp:
+                        if resp.status == 200:
+                            break
+                except OSError:
+                    time.sleep(0.005)
+            timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            proc.terminate()
+            proc.wait()
+    return statistics.median(timings)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure API cold start and fail on regressions")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement (median is used)")
+    parser.add_argument("--max-import-ms", type=float, help="Absolute budget for importing the app")
+    parser.add_argument("--max-ping-ms", type=float, help="Absolute budget for time-to-first-/ping")
+    parser.add_argument("--baseline", help="JSON file with baseline measurements to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown over the baseline (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the measurements to --baseline")
+    parser.add_argument("--module-budget", type=parse_budget, action="append", default=[], metavar="MODULE=MS",
+                        help="Override a module's import time budget (repeatable; 0 disables it)")
+    parser.add_argument("--skip-ping", action="store_true", help="Only measure import time")
+    args = parser.parse_args(argv)
+
+    if args.baseline and not args.update_baseline and not os.path.exists(args.baseline):
+        print(f"Error: baseline {args.baseline} not found (record one with --update-baseline)", file=sys.stderr)
+        return 2
+
+    imported = measure_import(args.runs)
+    module_ms = measure_module_imports(args.runs)
+    results = {"import_ms": round(imported["ms"], 1)}
+    if not args.skip_ping:
+        results["first_ping_ms"] = round(measure_first_ping(args.runs), 1)
+
+    print(f"import {APP_MODULE}: {results['import_ms']} ms")
+    if "first_ping_ms" in results:
+        print(f"time to first /ping: {results['first_ping_ms']} ms")
+
+    budgets = {**MODULE_BUDGETS_MS, **dict(args.module_budget)}
+    failures = []
+    for module, budget in budgets.items():
+        if not budget:
+            continue
+        if module not in module_ms:
+            failures.append(f"{module} is no longer imported at startup; update MODULE_BUDGETS_MS")
+            continue
+        print(f"  {module}: {module_ms[module]:.1f} ms (budget {budget:g} ms)")
+        if module_ms[module] > budget:
+            failures.append(f"importing {module} took {module_ms[module]:.1f} ms (budget {budget:g} ms)")
+    if imported["loaded"]:
+        failures.append(f"modules loaded at startup that should be lazy: {', '.join(imported['loaded'])}")
+    if args.max_import_ms is not None and results["import_ms"] > args.max_import_ms:
+        failures.append(f"import took {results['import_ms']} ms (budget {args.max_import_ms} ms)")
+    if args.max_ping_ms is not None and results.get("first_ping_ms", 0) > args.max_ping_ms:
+        failures.append(f"first /ping took {results['first_ping_ms']} ms (budget {args.max_ping_ms} ms)")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        for key, value in results.items():
+            reference = baseline.get(key)
+            if reference and value > reference * (1 + args.tolerance):
+                failures.append(f"{key} regressed: {value} ms vs baseline {reference} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+"""Application settings.
+
+Settings are loaded through dynaconf from ``conf/settings.toml`` (plus an optional,
+untracked ``conf/.secrets.toml``) and can be overridden with environment variables
+prefixed with ``CRAAP_``, e.g. ``CRAAP_CACHE_BACKEND=redis``.
+"""
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List
+
+
+@lru_cache(maxsize=1)
+def get_settings():
+    """Return the process-wide dynaconf settings object (created on first use)."""
+    from dynaconf import Dynaconf
+
+    return Dynaconf(
+        envvar_prefix="CRAAP",
+        settings_files=["conf/settings.toml", "conf/.secrets.toml"],
+    )
+
+
+def setting(name: str, default: Any = None) -> Any:
+    """Shortcut for ``get_settings().get(name, default)``."""
+    return get_settings().get(name, default)
+
+
+def setting_list(name: str) -> List[str]:
+    """A list setting, given as a list or a comma-separated string (environment variables)."""
+    value = setting(name) or []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+class WatchedFiles:
+    """Modification times of a set of files, for reloading them when one changes.
+
+    ``changed`` stats the files at most every ``interval`` seconds; ``mark`` records the
+    times of the files that were just loaded. A missing file counts as mtime -1.
+    """
+
+    def __init__(self, paths: Iterable[str], interval: float = 30.0):
+        self.paths = list(paths)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtimes: Dict[str, float] = {}
+
+    def current(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self.paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[path] = -1.0
+        return mtimes
+
+    def mark(self, mtimes: Dict[str, float]) -> None:
+        with self._lock:
+            self._mtimes, self._checked_at = mtimes, time.monotonic()
+
+    def changed(self) -> bool:
+        """Whether a file changed since the last ``mark`` (False until interval has passed)."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.interval:
+                return False
+            self._checked_at = now
+        return self.current() != self._mtimes
@@ -1,5 +1,5 @@
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pydantic import BaseModel
 from pydantic.types import Json
 
@@ -11,6 +11,11 @@ class AnalysisResponse(BaseModel):
     confidence: float
     processed_at: str
     raw_meta_tags: Optional[Json[Dict[str, Any]]] = None
+    computed_fields: Optional[List[str]] = None
+    truncated: Optional[str] = None  # limit ('bytes', 'nodes' or 'time') that cut the page short
+    canonical_url: Optional[str] = None
+    cached: bool = False
+    profile: Optional[Dict[str, Any]] = None
 
 @dataclass
 class MetaTagData:
@@ -41,3 +46,11 @@ class MetaTagData:
             self.keywords = []
         if self.author and not self.authors:
             self.authors = [self.author]
+
+
+@dataclass
+class FetchedPage:
+    """A fetched page: its body, the final URL and the redirect chain that led to it"""
+    html: str
+    url: str
+    redirects: List[str] = field(default_factory=list)
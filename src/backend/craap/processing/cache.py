@@ -0,0 +1,411 @@
+"""Cache backends shared by the API workers.
+
+Fetched pages and enrichment lookups (DataCite, IPQualityScore) are cached so that
+repeated analyses don't hit the network again. Because the app usually runs under
+several uvicorn/gunicorn workers, the default backend is a SQLite database in WAL
+mode that every worker process on the host opens; a Redis backend can be selected
+for multi-host deployments and an in-memory backend is available for tests.
+
+All backends store string values (callers serialise to JSON) and share the same
+small interface, so a new backend only has to implement ``get``/``set``/``delete``/``clear``
+and ``keys`` (a prefix scan, for values that workers store under keys of their own).
+A cache that is unavailable (locked database, Redis outage) behaves as a miss and
+drops writes instead of failing the request. The SQLite and in-memory backends are
+bounded by entries and by bytes: a fetched page may be megabytes of HTML.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from src.backend.craap.config import setting
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Minimal key/value cache interface with per-entry TTLs."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None when missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Store value under key; ttl is in seconds (None uses the backend default)."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key if present."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+
+    @abstractmethod
+    def keys(self, prefix: str) -> List[str]:
+        """Keys (not expired) starting with prefix; empty when the cache can't be read."""
+
+    def get_json(self, key: str) -> Any:
+        """Return the decoded JSON value for key, or None."""
+        raw = self.get(key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value as JSON under key."""
+        self.set(key, json.dumps(value, ensure_ascii=False), ttl=ttl)
+
+
+class NullCache(CacheBackend):
+    """Backend that never stores anything (CACHE_BACKEND=none)."""
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def keys(self, prefix: str) -> List[str]:
+        return []
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache; a local stand-in for the shared backends in tests."""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[float] = None, max_bytes: int = 0):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        # bound on the stored values' total length (0 for none); characters, not encoded bytes
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self._size -= len(value)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._drop(key)
+            if self.max_bytes and len(value) > self.max_bytes:
+                return
+            self._entries[key] = (value, expires_at)
+            self._size += len(value)
+            while len(self._entries) > self.max_entries or (self.max_bytes and self._size > self.max_bytes):
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def keys(self, prefix: str) -> List[str]:
+        now = time.time()
+        with self._lock:
+            return [key for key, (_, expires_at) in self._entries.items()
+                    if key.startswith(prefix) and (expires_at is None or expires_at > now)]
+
+
+class SQLiteCache(CacheBackend):
+    """SQLite (WAL mode) cache shared by all worker processes on a host.
+
+    Eviction is approximate LRU: each entry carries an ``accessed_at`` timestamp that is
+    refreshed on reads (at most once per ``touch_interval`` seconds to keep reads cheap),
+    and every ``prune_every`` writes (or after ``max_bytes / 10`` bytes written) expired
+    entries are dropped and the table is trimmed back to ``max_entries`` and ``max_bytes``
+    (UTF-8 size of the values) by evicting the least recently accessed rows. A value
+    larger than ``max_bytes`` is not stored. The cache is used from the event loop, so a
+    database another worker holds locked is waited on for ``timeout`` seconds only (tens
+    of milliseconds), then the read is a miss and the write is dropped.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache ("
+        " key TEXT PRIMARY KEY,"
+        " value TEXT NOT NULL,"
+        " expires_at REAL,"
+        " accessed_at REAL NOT NULL,"
+        " size INTEGER NOT NULL DEFAULT 0)"
+    )
+
+    def __init__(self, path: str, max_entries: int = 10000, default_ttl: Optional[float] = None,
+                 prune_every: int = 100, touch_interval: float = 60.0, max_bytes: int = 0,
+                 timeout: float = 0.05):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.prune_every = max(1, prune_every)
+        self.touch_interval = touch_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._bytes_written = 0
+        self._writes_lock = threading.Lock()
+
+    def _connection(self):
+        # one connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        import sqlite3
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(self._SCHEMA)
+        if "size" not in {row[1] for row in conn.execute("PRAGMA table_info(cache)")}:
+            # databases created before the byte bound; their rows count as 0 bytes until rewritten
+            try:
+                conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                # another worker added it first
+                pass
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        # covers the byte-bound prune, so it never reads the (large) values
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_size ON cache (accessed_at, size)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            return self._get(key)
+        except Exception as e:
+            # a broken or locked cache must never fail the analysis itself
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        try:
+            self._set(key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+    def _get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            return None
+        if now - accessed_at >= self.touch_interval:
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        size = len(value.encode("utf-8"))
+        conn = self._connection()
+        if self.max_bytes and size > self.max_bytes:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at, size) VALUES (?, ?, ?, ?, ?)",
+            (key, value, expires_at, now, size),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            self._bytes_written += size
+            due = self._writes % self.prune_every == 0 or (
+                self.max_bytes and self._bytes_written > self.max_bytes / 10)
+            if due:
+                self._bytes_written = 0
+        if due:
+            self.prune()
+
+    def prune(self) -> None:
+        """Drop expired entries and evict least recently used ones beyond max_entries."""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        if self.max_bytes:
+            conn.execute(
+                "DELETE FROM cache WHERE rowid IN ("
+                " SELECT rowid FROM (SELECT rowid, SUM(size) OVER (ORDER BY accessed_at DESC"
+                " ROWS UNBOUNDED PRECEDING) AS total FROM cache) WHERE total > ?)",
+                (self.max_bytes,),
+            )
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM cache")
+
+    def keys(self, prefix: str) -> List[str]:
+        try:
+            # a range on the primary key instead of LIKE, whose wildcards the prefix could contain
+            rows = self._connection().execute(
+                "SELECT key FROM cache WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+                (prefix, prefix + "\U0010ffff", time.time()),
+            ).fetchall()
+        except Exception as e:
+            logger.warning(f"Cache scan failed for {prefix}: {e}")
+            return []
+        return [row[0] for row in rows]
+
+
+class RedisCache(CacheBackend):
+    """Redis (or Redis-compatible) backend for deployments spanning several hosts.
+
+    The size bound and eviction policy are the server's (``maxmemory`` with an
+    ``allkeys-lru`` policy); this class only namespaces keys and applies TTLs. Commands
+    time out after ``timeout`` seconds, and a failing server reads as a miss.
+    """
+
+    def __init__(self, url: str, prefix: str = "craap:", default_ttl: Optional[float] = None, client=None,
+                 timeout: float = 1.0):
+        try:
+            import redis
+        except ImportError as e:
+            if client is None:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            redis = None
+        if client is None:
+            client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        # connection errors, timeouts and server errors (OSError covers a client without redis-py)
+        self._errors = (redis.exceptions.RedisError, OSError) if redis else (OSError,)
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.client.get(self.prefix + key)
+        except self._errors as e:
+            # an unreachable cache must never fail the analysis itself
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return None
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        try:
+            if ttl:
+                self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+            else:
+                self.client.set(self.prefix + key, value)
+        except self._errors as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def keys(self, prefix: str) -> List[str]:
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", self.prefix + prefix) + "*"
+        try:
+            keys = list(self.client.scan_iter(match=pattern))
+        except self._errors as e:
+            logger.warning(f"Cache scan failed for {prefix}: {e}")
+            return []
+        return [(k.decode("utf-8") if isinstance(k, bytes) else k)[len(self.prefix):] for k in keys]
+
+
+def create_cache(backend: Optional[str] = None) -> CacheBackend:
+    """Build a cache backend from settings (CACHE_BACKEND: sqlite, redis, memory or none)."""
+    backend = (backend or setting("CACHE_BACKEND", "sqlite")).lower()
+    max_entries = int(setting("CACHE_MAX_ENTRIES", 10000))
+    max_bytes = int(setting("CACHE_MAX_BYTES", 500_000_000))
+    if backend == "none":
+        return NullCache()
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, max_bytes=max_bytes)
+    if backend == "redis":
+        return RedisCache(setting("CACHE_REDIS_URL", "redis://localhost:6379/0"),
+                          timeout=float(setting("CACHE_REDIS_TIMEOUT", 1.0)))
+    if backend == "sqlite":
+        path = setting("CACHE_PATH") or os.path.join(tempfile.gettempdir(), "craap-cache.sqlite3")
+        return SQLiteCache(path, max_entries=max_entries, max_bytes=max_bytes,
+                           timeout=float(setting("CACHE_SQLITE_TIMEOUT", 0.05)))
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """Return the process-wide cache backend, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+    return _cache
+
+
+def set_cache(cache: Optional[CacheBackend]) -> None:
+    """Replace the process-wide cache (e.g. with a MemoryCache in tests); None resets it."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def cache_ttl(kind: str) -> float:
+    """TTL in seconds for a cache namespace ('page', 'enrichment', 'analysis' or 'alias')."""
+    defaults = {"page": 3600, "enrichment": 86400, "analysis": 3600, "alias": 30 * 86400}
+    return float(setting(f"CACHE_{kind.upper()}_TTL", defaults.get(kind, 3600)))
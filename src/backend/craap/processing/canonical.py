@@ -0,0 +1,191 @@
+"""URL canonicalization and alias -> canonical mapping.
+
+The same article reaches the API under many URLs: with tracking parameters, as an
+AMP page, over http before redirecting to https, or as one of Dataverse's
+``?persistentId=`` forms. ``canonicalize_url`` normalizes those variants without a
+network round trip; ``AliasMap`` remembers what the fetch taught us (redirect chains,
+``<link rel="canonical">``/``og:url``) in the shared cache, so a later request for any
+alias resolves to the one cached analysis (``AnalysisCache``) without fetching again.
+
+A page's declared canonical URL is only trusted when it can't merge unrelated pages
+(``trusted_canonical``): it must be on the same site, and one with a different path or
+query (e.g. the site root) is ignored unless the page is already a known alias of it.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from src.backend.craap.processing.cache import CacheBackend, cache_ttl
+
+# query parameters that never change the content of a page
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'twclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'mkt_tok', 'ref_src', 'ref_url',
+    'cmpid', 'ocid', 'ncid', 'sr_share', 'smid', 'share', 'amp', 'outputtype',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_', 'vero_', 'oly_')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def _strip_amp_path(path: str) -> str:
+    if path.endswith('/amp') or path.endswith('/amp/'):
+        path = path[:path.rstrip('/').rfind('/')] or '/'
+    if path.startswith('/amp/'):
+        path = path[4:]
+    if path.endswith('.amp.html'):
+        path = path[:-len('.amp.html')] + '.html'
+    elif path.endswith('.amp'):
+        path = path[:-len('.amp')]
+    return path
+
+
+def canonicalize_url(url: str) -> str:
+    """Return the canonical form of an absolute http(s) URL.
+
+    - lower-cases scheme and host, drops default ports, credentials and the fragment
+    - removes tracking parameters (utm_*, fbclid, gclid, ...) and AMP markers
+      (``amp.`` hosts, ``/amp`` path segments, ``.amp.html``, ``?amp``/``?outputType=amp``)
+    - reduces ``?persistentId=`` URLs to that parameter (and ``version``, which selects
+      a different dataset version)
+    - an empty path becomes ``/``
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('amp.'):
+        host = host[4:]
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{host}:{parts.port}'
+
+    path = _strip_amp_path(parts.path or '/')
+
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    persistent = [(k, v) for k, v in params if k == 'persistentId']
+    if persistent:
+        versions = [(k, v) for k, v in params if k == 'version']
+        params = persistent[:1] + versions[:1]
+    else:
+        params = [(k, v) for k, v in params if not _is_tracking_param(k)]
+    query = urlencode(params, safe=':/')
+
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def _site(host: Optional[str]) -> str:
+    host = (host or '').lower()
+    for prefix in ('www.', 'amp.', 'm.'):
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+def same_site(url: str, other: str) -> bool:
+    """True when both URLs are on the same host, ignoring www./amp./m. prefixes."""
+    return _site(urlsplit(url).hostname) == _site(urlsplit(other).hostname)
+
+
+def _resource(url: str) -> Tuple[str, str]:
+    # path and query of a canonicalized URL, ignoring a trailing slash
+    parts = urlsplit(url)
+    return parts.path.rstrip('/') or '/', parts.query
+
+
+def trusted_canonical(declared: Optional[str], page_urls: List[str], aliases: 'AliasMap') -> Optional[str]:
+    """The canonical form of a page's declared canonical URL, or None when it isn't trusted.
+
+    page_urls are the URLs the page was requested and fetched under (the fetched URL
+    first). A page may only claim a canonical URL on its own site, otherwise any page
+    could overwrite the cached analysis of another site's article. Templates that point
+    every page at the home page, or at one article, would still merge a whole site into
+    one analysis, so a canonical with a different path or query (the site root, for an
+    article) is only accepted when one of page_urls is already a known alias of it.
+    """
+    if not declared or not page_urls or not same_site(declared, page_urls[0]):
+        return None
+    canonical = canonicalize_url(declared)
+    if _resource(canonical) == _resource(canonicalize_url(page_urls[0])):
+        return canonical
+    if any(aliases.resolve(url) == canonical for url in page_urls if url):
+        return canonical
+    return None
+
+
+class AliasMap:
+    """Persistent alias -> canonical URL map stored in the shared cache."""
+
+    def __init__(self, cache: CacheBackend):
+        self.cache = cache
+
+    def resolve(self, url: str) -> str:
+        """Canonical URL for url: a recorded mapping, or else its canonicalized form."""
+        key = canonicalize_url(url)
+        return self.cache.get(f'alias:{key}') or key
+
+    def record(self, canonical: str, aliases: Iterable[str]) -> None:
+        """Map every alias (and the canonical URL itself) to canonical."""
+        ttl = cache_ttl('alias')
+        for alias in {canonicalize_url(a) for a in aliases if a} | {canonical}:
+            self.cache.set(f'alias:{alias}', canonical, ttl=ttl)
+
+
+class AnalysisCache:
+    """Analysis results keyed by canonical URL.
+
+    Each result is stored as it was computed: the serialized MetaTagData, the fields that
+    were computed and the enrichers (DataCite, reputation) that completed for it. Results
+    of different runs are never merged; a request is served from one result that computed
+    every requested field and completed exactly the enrichers the request asks for (DataCite
+    overwrites page fields, so an enriched result can't answer a request without it), so
+    the answer doesn't depend on which request came first. Up to MAX_RESULTS results are kept per URL.
+    """
+
+    MAX_RESULTS = 4
+
+    def __init__(self, cache: CacheBackend):
+        self.cache = cache
+
+    def _results(self, canonical: str) -> List[Dict[str, Any]]:
+        entry = self.cache.get_json(f'analysis:{canonical}')
+        results = entry.get('results') if isinstance(entry, dict) else None
+        return [r for r in results if isinstance(r, dict)] if isinstance(results, list) else []
+
+    def get(self, canonical: str, fields: List[str], enrichers: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+        """A stored result covering fields with these enrichers, masked to fields (None when there is none)."""
+        fields, enrichers = set(fields), set(enrichers)
+        for entry in self._results(canonical):
+            if fields <= set(entry.get('computed_fields') or []) and enrichers == set(entry.get('enriched') or []):
+                break
+        else:
+            return None
+        meta = entry.get('meta') or {}
+        entry['meta'] = {
+            name: value if name in fields else ([] if isinstance(value, list) else None)
+            for name, value in meta.items()
+        }
+        entry['computed_fields'] = [name for name in entry['computed_fields'] if name in fields]
+        return entry
+
+    def set(self, canonical: str, meta: Dict[str, Any], computed_fields: List[str],
+            truncated: Optional[str] = None, enriched: Iterable[str] = ()) -> None:
+        """Store an analysis next to the existing results it doesn't supersede."""
+        result = {
+            'meta': meta,
+            'computed_fields': list(computed_fields),
+            'enriched': sorted(enriched),
+            'truncated': truncated,
+        }
+        # results the new one can answer every request for are dropped
+        kept = [
+            r for r in self._results(canonical)
+            if not (set(r.get('computed_fields') or []) <= set(result['computed_fields'])
+                    and set(r.get('enriched') or []) == set(result['enriched']))
+        ]
+        self.cache.set_json(f'analysis:{canonical}', {
+            'results': ([result] + kept)[:self.MAX_RESULTS],
+        }, ttl=cache_ttl('analysis'))
@@ -8,8 +8,6 @@ import sys
 import json
 from typing import List, Optional
 
-import requests
-
 
 def resolve_ips(hostname: str, prefer_ipv4: bool = True) -> List[str]:
     """Resolve a hostname to a list of IP addresses (IPv4 and IPv6).
@@ -33,15 +31,23 @@ def resolve_ips(hostname: str, prefer_ipv4: bool = True) -> List[str]:
     return ips
 
 
-def query_ipqualityscore(api_key: str, ip: str, strict: bool = False, timeout: int = 8) -> dict:
+IPQS_API_URL = "https://ipqualityscore.com/api/json/ip"
+
+
+def query_ipqualityscore(api_key: str, ip: str, strict: bool = False, timeout: int = 8,
+                         base_url: str = IPQS_API_URL) -> dict:
     """Call the IPQualityScore API for the given IP and return parsed JSON.
 
     API docs: https://www.ipqualityscore.com/documentation/ip-reputation-api/overview
     Endpoint: https://ipqualityscore.com/api/json/ip/{API_KEY}/{ip_address}
+    base_url can point at a stand-in service (e.g. the load-test origin in bench/origin.py).
     """
     if not api_key:
         raise ValueError("API key is required")
-    url = f"https://ipqualityscore.com/api/json/ip/{api_key}/{ip}"
+    # imported here so importing this module (e.g. for resolve_ips) stays cheap
+    import requests
+
+    url = f"{base_url.rstrip('/')}/{api_key}/{ip}"
     params = {}
     if strict:
         params['strictness'] = 1
@@ -61,7 +67,8 @@ def query_ipqualityscore(api_key: str, ip: str, strict: bool = False, timeout: i
         raise RuntimeError(f"Failed to parse JSON response from IPQualityScore: {e}")
 
 
-def reputation_summary(api_key: str, ip: str, strict: bool = False, timeout: int = 8) -> Optional[dict]:
+def reputation_summary(api_key: str, ip: str, strict: bool = False, timeout: int = 8,
+                       base_url: str = IPQS_API_URL) -> Optional[dict]:
     """Return a compact reputation summary for an IP by querying IPQualityScore.
 
     The summary contains only a few useful fields:
@@ -73,7 +80,7 @@ def reputation_summary(api_key: str, ip: str, strict: bool = False, timeout: int
     Returns None on error or if API response doesn't include these fields.
     """
     try:
-        full = query_ipqualityscore(api_key, ip, strict=strict, timeout=timeout)
+        full = query_ipqualityscore(api_key, ip, strict=strict, timeout=timeout, base_url=base_url)
     except Exception as e:
         # bubble up None to indicate not available
         return None
@@ -1,7 +1,8 @@
-import dns.resolver
 from urllib.parse import urlparse
 
 def check_spamhaus_dbl(url: str):
+    import dns.resolver
+
     domain = urlparse(url).hostname
     query = f"{domain}.dbl.spamhaus.org"
     try:
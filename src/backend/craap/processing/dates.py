@@ -0,0 +1,238 @@
+"""Date normalization for extracted metadata.
+
+``dateutil.parser.parse`` understands almost anything but costs tens of microseconds per
+call, and pages (and feeds) carry many candidate dates. ``DateNormalizer`` tries, in
+order:
+
+  1. an ISO-8601 fast path (``datetime.fromisoformat``), which covers most meta tags
+     and DataCite dates;
+  2. the publisher formats that already matched for the same domain (a bounded LRU of
+     learned formats per domain);
+  3. the remaining precompiled publisher formats (RFC 822 dates from feeds,
+     ``March 1, 2024``, ``1 March 2024``, ``2024/03/01``, ``03/01/2024``, ctime);
+  4. dateutil, as the fallback. A domain whose dates only dateutil understands learns
+     that too: while dateutil is its most recently matched format, its dates skip
+     straight to it (the patterns are only tried when dateutil fails).
+
+The precompiled formats give the same result dateutil would for the strings they
+accept (``bench/dates.py`` checks this over a large corpus). ``normalize`` keeps
+reduced-precision ISO dates (``2024``, ``2024-03``, as DataCite publishes them) as they
+are, instead of filling in today's month and day.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.backend.craap.config import setting
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'),
+        ('may',), ('jun', 'june'), ('jul', 'july'), ('aug', 'august'),
+        ('sep', 'sept', 'september'), ('oct', 'october'), ('nov', 'november'), ('dec', 'december'),
+    ], start=1)
+    for name in names
+}
+
+WEEKDAYS = {
+    'mon', 'monday', 'tue', 'tues', 'tuesday', 'wed', 'wednesday', 'thu', 'thur', 'thurs',
+    'thursday', 'fri', 'friday', 'sat', 'saturday', 'sun', 'sunday',
+}
+
+UTC_NAMES = {'gmt', 'utc', 'z'}
+
+# reduced-precision ISO dates: a year, or a year and month
+REDUCED_ISO = re.compile(r'^\d{4}(-\d{2})?$')
+
+_TIME = (r'(?:(?:\s+|T|,\s*|\s+at\s+)(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?'
+         r'(?:\s*(?P<meridiem>[AaPp])\.?[Mm]\.?)?)?')
+_ZONE = r'(?:\s*(?P<zone>GMT|UTC|Z|[+-]\d{2}:?\d{2}))?'
+_WEEKDAY = r'(?:(?P<weekday>[A-Za-z]+),?\s+)?'
+
+# publisher formats, tried in this order unless a domain learned otherwise
+PATTERNS: List[Tuple[str, 're.Pattern']] = [(name, re.compile(pattern)) for name, pattern in [
+    # RFC 822 / 1123 as used by RSS: "Fri, 01 Mar 2024 10:00:00 GMT", also "1 March 2024"
+    ('day_month_year', rf'^{_WEEKDAY}(?P<day>\d{{1,2}})\s+(?P<month>[A-Za-z]+)\.?,?\s+(?P<year>\d{{4}}){_TIME}{_ZONE}$'),
+    # "March 1, 2024", "Friday, March 1st, 2024 at 10:00 AM"
+    ('month_day_year', rf'^{_WEEKDAY}(?P<month>[A-Za-z]+)\.?\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?,?\s+(?P<year>\d{{4}})'
+                       rf'{_TIME}{_ZONE}$'),
+    # "2024/03/01", "2024.03.01 10:00"
+    ('year_month_day', rf'^(?P<year>\d{{4}})(?P<sep>[/.])(?P<month>\d{{1,2}})(?P=sep)(?P<day>\d{{1,2}}){_TIME}{_ZONE}$'),
+    # "03/01/2024": month first, like dateutil, unless the first number can't be a month
+    ('numeric_year_last', rf'^(?P<first_number>\d{{1,2}})/(?P<second_number>\d{{1,2}})/(?P<year>\d{{4}}){_TIME}{_ZONE}$'),
+    # ctime / asctime: "Fri Mar  1 10:00:00 2024"
+    ('ctime', r'^(?P<weekday>[A-Za-z]+)\s+(?P<month>[A-Za-z]+)\s+(?P<day>\d{1,2})\s+'
+              r'(?P<hour>\d{1,2}):(?P<minute>\d{2}):(?P<second>\d{2})\s+(?P<year>\d{4})$'),
+]]
+
+DATEUTIL = -1  # learned "format" meaning: go straight to dateutil
+
+
+def _zone(text: Optional[str]) -> Optional[timezone]:
+    if not text:
+        return None
+    if text.lower() in UTC_NAMES:
+        return timezone.utc
+    sign = -1 if text[0] == '-' else 1
+    digits = text[1:].replace(':', '')
+    offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+    return timezone.utc if not offset else timezone(sign * offset)
+
+
+def _build(match: 're.Match') -> Optional[datetime]:
+    values = match.groupdict()
+    weekday = values.get('weekday')
+    if weekday and weekday.lower() not in WEEKDAYS:
+        return None
+    month = values.get('month')
+    if month is None:
+        first, second = int(values['first_number']), int(values['second_number'])
+        month, day = (second, first) if first > 12 else (first, second)
+    else:
+        day = int(values['day'])
+        month = int(month) if month.isdigit() else MONTHS.get(month.lower())
+        if month is None:
+            return None
+    hour, minute, second, meridiem = values['hour'], values['minute'], values['second'], values.get('meridiem')
+    hour = int(hour) if hour else 0
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem in 'pP' else 0)
+    zone = values.get('zone')
+    try:
+        return datetime(int(values['year']), month, day, hour, int(minute) if minute else 0,
+                        int(second) if second else 0, tzinfo=_zone(zone) if zone else None)
+    except ValueError:
+        return None
+
+
+def _iso(text: str) -> Optional[datetime]:
+    # cheap shape check first: fromisoformat raising is the expensive path
+    if len(text) < 10 or text[4] != '-' or not text[:4].isdigit():
+        return None
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _dateutil(text: str) -> Optional[datetime]:
+    import dateutil.parser
+
+    try:
+        return dateutil.parser.parse(text)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+class DateNormalizer:
+    """Parses date strings, learning which format each domain uses."""
+
+    def __init__(self, max_domains: int = 1024, max_formats: int = 3,
+                 fallback: Callable[[str], Optional[datetime]] = _dateutil):
+        self.max_domains = max_domains
+        self.max_formats = max_formats
+        self.fallback = fallback
+        self._learned: 'OrderedDict[str, List[int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # how each parsed string was handled
+        self.stats: Dict[str, int] = {'iso': 0, 'learned': 0, 'pattern': 0, 'dateutil': 0, 'failed': 0}
+
+    def learned(self, domain: str) -> List[str]:
+        """Names of the formats learned for domain, most recent first."""
+        return [PATTERNS[i][0] if i != DATEUTIL else 'dateutil' for i in self._learned.get(domain, [])]
+
+    def _touch(self, domain: str) -> None:
+        try:
+            self._learned.move_to_end(domain)
+        except KeyError:
+            # evicted by another thread in the meantime
+            pass
+
+    def _learn(self, domain: Optional[str], index: int) -> None:
+        if not domain or not self.max_domains:
+            return
+        with self._lock:
+            formats = self._learned.pop(domain, [])
+            self._learned[domain] = [index] + [i for i in formats if i != index][:self.max_formats - 1]
+            while len(self._learned) > self.max_domains:
+                self._learned.popitem(last=False)
+
+    def parse(self, text: Optional[str], domain: Optional[str] = None) -> Optional[datetime]:
+        """Parse text into a datetime (None when it isn't a date)."""
+        if not text or not isinstance(text, str):
+            return None
+        text = text.strip()
+        if not text:
+            return None
+
+        parsed = _iso(text)
+        if parsed is not None:
+            self.stats['iso'] += 1
+            return parsed
+
+        learned = self._learned.get(domain, ()) if domain else ()
+        if learned and learned[0] == DATEUTIL:
+            parsed = self.fallback(text)
+            if parsed is not None:
+                self.stats['dateutil'] += 1
+                self._touch(domain)
+                return parsed
+        for index in learned:
+            if index == DATEUTIL:
+                break
+            match = PATTERNS[index][1].match(text)
+            if match and (parsed := _build(match)) is not None:
+                self.stats['learned'] += 1
+                if index != learned[0]:
+                    self._learn(domain, index)
+                else:
+                    self._touch(domain)
+                return parsed
+
+        for index, (name, pattern) in enumerate(PATTERNS):
+            if index in learned:
+                continue
+            match = pattern.match(text)
+            if match and (parsed := _build(match)) is not None:
+                self.stats['pattern'] += 1
+                self._learn(domain, index)
+                return parsed
+
+        parsed = self.fallback(text)
+        if parsed is None:
+            self.stats['failed'] += 1
+            return None
+        self.stats['dateutil'] += 1
+        if not learned or learned[0] != DATEUTIL:
+            self._learn(domain, DATEUTIL)
+        return parsed
+
+    def normalize(self, text: Optional[str], domain: Optional[str] = None) -> Optional[str]:
+        """ISO 8601 form of a date string; reduced-precision ISO dates are returned unchanged."""
+        if text is None:
+            return None
+        text = str(text).strip()
+        if REDUCED_ISO.match(text):
+            return text
+        # a date range ("2020-01-01/2020-12-31", as in DataCite) normalizes to its start
+        start, sep, end = text.partition('/')
+        if sep and all(_iso(part) or REDUCED_ISO.match(part) for part in (start, end)):
+            return self.normalize(start, domain)
+        parsed = self.parse(text, domain)
+        return parsed.isoformat() if parsed else None
+
+
+_normalizer: Optional[DateNormalizer] = None
+
+
+def get_date_normalizer() -> DateNormalizer:
+    """Process-wide normalizer (its learned formats are shared by all requests)."""
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = DateNormalizer(max_domains=int(setting('DATE_FORMAT_CACHE_SIZE', 1024)))
+    return _normalizer
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Columnar export of analysis results.
+
+Writes batches of MetaTagData records to Arrow IPC (``.arrow``) or Parquet
+(``.parquet``) files with a fixed schema derived from MetaTagData: string columns for
+the scalar fields, ``list<string>`` for ``authors``/``keywords`` and a struct for
+``reputation``. Records are buffered per batch and written incrementally, so memory
+stays bounded by ``batch_size`` regardless of how many records are exported, and the
+files can be opened with memory mapping (``read_columnar``).
+
+Requires the optional ``pyarrow`` dependency (``pip install craap[export]``).
+
+Usage:
+    python -m src.backend.craap.processing.export results.jsonl -o results.parquet
+"""
+import argparse
+import dataclasses
+import json
+import sys
+import typing
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from src.backend.craap.model.data_model import MetaTagData
+
+FORMATS = {'.arrow': 'arrow', '.ipc': 'arrow', '.feather': 'arrow', '.parquet': 'parquet'}
+
+# reputation summaries come from IPQualityScore (check_reputation.reputation_summary) or
+# from the local index (reputation_index.ReputationIndex.lookup); unknown keys are dropped
+REPUTATION_FIELDS = [
+    ('fraud_score', 'int64'),
+    ('fraudulent', 'bool'),
+    ('country_code', 'string'),
+    ('ISP', 'string'),
+    ('ASN', 'int64'),
+    ('listed', 'bool'),
+    ('blocklist', 'string'),
+    ('asn_listed', 'bool'),
+    ('_ip', 'string'),
+    ('_source', 'string'),
+]
+
+
+def _to_bool(value: Any) -> Optional[bool]:
+    # JSON round trips and some APIs give "true"/"false" strings; bool("false") would be True
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ('true', '1', 'yes', 'y', 't'):
+        return True
+    if text in ('false', '0', 'no', 'n', 'f'):
+        return False
+    return None
+
+
+def _to_int(value: Any) -> Optional[int]:
+    # ASNs are often written "AS13335"
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if value[:2].upper() == 'AS':
+            value = value[2:]
+    return int(value)
+
+
+_CASTS = {'int64': _to_int, 'bool': _to_bool, 'string': str}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Columnar export requires the 'pyarrow' package (pip install craap[export])") from e
+    return pyarrow
+
+
+def metatag_schema():
+    """Arrow schema for MetaTagData records."""
+    pa = _pyarrow()
+    hints = typing.get_type_hints(MetaTagData)
+    columns = []
+    for field in dataclasses.fields(MetaTagData):
+        if field.name == 'reputation':
+            arrow_types = {'int64': pa.int64(), 'bool': pa.bool_(), 'string': pa.string()}
+            arrow_type = pa.struct([(name, arrow_types[kind]) for name, kind in REPUTATION_FIELDS])
+        elif typing.get_origin(hints[field.name]) in (list, List):
+            arrow_type = pa.list_(pa.string())
+        else:
+            arrow_type = pa.string()
+        columns.append(pa.field(field.name, arrow_type))
+    return pa.schema(columns)
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    if value is None:
+        return None
+    try:
+        return _CASTS[kind](value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(record: Union[MetaTagData, Dict[str, Any]]) -> Dict[str, Any]:
+    data = dataclasses.asdict(record) if dataclasses.is_dataclass(record) else record
+    row = {}
+    for field in dataclasses.fields(MetaTagData):
+        value = data.get(field.name)
+        if field.name == 'reputation':
+            row[field.name] = (
+                {name: _coerce(value.get(name), kind) for name, kind in REPUTATION_FIELDS}
+                if isinstance(value, dict) else None
+            )
+        elif isinstance(value, (list, tuple)):
+            row[field.name] = [str(v) for v in value if v is not None]
+        else:
+            row[field.name] = None if value is None else str(value)
+    return row
+
+
+class ColumnarWriter:
+    """Incrementally writes MetaTagData records (or their dict form) to Arrow IPC or Parquet."""
+
+    def __init__(self, path: str, format: Optional[str] = None, batch_size: int = 10_000):
+        pa = _pyarrow()
+        self.path = path
+        self.format = format or _format_for(path)
+        self.batch_size = batch_size
+        self.schema = metatag_schema()
+        self.rows_written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        if self.format == 'parquet':
+            self._writer = pa.parquet.ParquetWriter(path, self.schema)
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write(self, record: Union[MetaTagData, Dict[str, Any]]) -> None:
+        self._buffer.append(_row(record))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[Union[MetaTagData, Dict[str, Any]]]) -> None:
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        pa = _pyarrow()
+        self._writer.write_batch(pa.RecordBatch.from_pylist(self._buffer, schema=self.schema))
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+        if self.format != 'parquet':
+            self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _format_for(path: str) -> str:
+    for suffix, fmt in FORMATS.items():
+        if path.lower().endswith(suffix):
+            return fmt
+    raise ValueError(f"Cannot infer export format from {path!r}; use one of {', '.join(FORMATS)}")
+
+
+def write_columnar(records: Iterable[Union[MetaTagData, Dict[str, Any]]], path: str,
+                   format: Optional[str] = None, batch_size: int = 10_000) -> int:
+    """Write records to path; returns the number of rows written."""
+    with ColumnarWriter(path, format=format, batch_size=batch_size) as writer:
+        writer.write_many(records)
+    return writer.rows_written
+
+
+def read_columnar(path: str, format: Optional[str] = None):
+    """Open an exported file as a pyarrow Table, memory-mapping it instead of copying it into memory."""
+    pa = _pyarrow()
+    if (format or _format_for(path)) == 'parquet':
+        return pa.parquet.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def iter_json_records(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield MetaTagData dicts from JSON-lines files, or from JSON files holding one object
+    (e.g. convert_to_json output) or an array of objects. JSON lines are streamed."""
+    for path in paths:
+        with (sys.stdin if path == '-' else open(path, encoding='utf-8')) as fh:
+            first_line = fh.readline()
+            try:
+                first = json.loads(first_line)
+            except ValueError:
+                # not JSON lines: a (pretty-printed) document that has to be read as a whole
+                data = json.loads(first_line + fh.read())
+                yield from (data if isinstance(data, list) else [data])
+                continue
+            yield from (first if isinstance(first, list) else [first])
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export MetaTagData JSON/JSON-lines to Arrow IPC or Parquet")
+    parser.add_argument('inputs', nargs='+', help="JSON or JSON-lines files ('-' for stdin)")
+    parser.add_argument('--output', '-o', required=True, help='Output file (.arrow/.ipc/.feather or .parquet)')
+    parser.add_argument('--batch-size', type=int, default=10_000, help='Records per written batch')
+    args = parser.parse_args(argv)
+
+    try:
+        rows = write_columnar(iter_json_records(args.inputs), args.output, batch_size=args.batch_size)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    print(f"wrote {rows} records to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
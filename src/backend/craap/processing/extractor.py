@@ -1,227 +1,514 @@
+from __future__ import annotations
+
 from datetime import datetime
-from typing import List, Optional
-from bs4 import BeautifulSoup
-import dateutil.parser
+from typing import TYPE_CHECKING, Iterable, List, Optional
+import asyncio
 import dataclasses
 import json
+import re
 from typing import Any
 from urllib.parse import unquote, quote
-import requests
 import os
-from urllib.parse import urlparse
-from src.backend.craap.processing.check_reputation import resolve_ips, reputation_summary
+import time
+from urllib.parse import urljoin, urlparse
+from src.backend.craap.config import setting
+from src.backend.craap.processing.cache import get_cache, cache_ttl
+from src.backend.craap.processing.dates import get_date_normalizer
+from src.backend.craap.processing.limits import ParseLimits, parse_html
+from src.backend.craap.processing.profiling import StageTimer
+from src.backend.craap.processing.reputation_index import get_reputation_index
+from src.backend.craap.processing.rules import get_extraction_rules
 from src.backend.craap.model.data_model import MetaTagData
 
+# bs4, dateutil (processing/dates.py), requests and the reputation client are imported where they are first
+# used so that starting a worker doesn't pay for them (see bench/startup.py)
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+
+# basic DOI regex (not exhaustive but practical)
+DOI_PATTERN = re.compile(r'\b(10\.\d{4,9}/\S+?)\b')
+
+# field name -> method extracting it from the parsed page
+HTML_FIELD_EXTRACTORS = {
+    'publication_date': 'extract_publication_date',
+    'last_modification_date': 'extract_modification_date',
+    'author': 'extract_author',
+    'authors': 'extract_authors',
+    'description': 'extract_description',
+    'keywords': 'extract_keywords',
+    'publisher': 'extract_publisher',
+    'title': 'extract_title',
+    'doi': 'extract_doi',
+    'language': 'extract_language',
+    'content_type': 'extract_content_type',
+    'generator': 'extract_generator',
+    'viewport': 'extract_viewport',
+    'robots': 'extract_robots',
+    'refresh': 'extract_refresh',
+}
+
+FIELD_NAMES = tuple(f.name for f in dataclasses.fields(MetaTagData))
+
+# enricher name -> method adding network-sourced metadata to an extracted result
+ENRICHERS = {
+    'datacite': 'enrich_datacite',
+    'reputation': 'enrich_reputation',
+}
+
+# fields that need other fields computed first
+FIELD_DEPENDENCIES = {
+    'reputation': ('ip_address',),
+}
+
+# enrichers a request can ask for by name (enrich=...) on top of the ones its fields
+# trigger: DataCite metadata then overwrites the selected fields even without 'doi'
+EXPLICIT_ENRICHERS = ('datacite',)
+
+
+def resolve_fields(fields: Optional[Iterable[str]]) -> List[str]:
+    """Validate a field selection and add its dependencies.
+
+    Accepts an iterable of names or a comma separated string; None (or a blank string)
+    selects every field. Returns the selected names in MetaTagData order. Raises ValueError
+    on entries that aren't strings, on unknown names and on a selection with no names.
+    """
+    if isinstance(fields, str):
+        fields = fields.split(',') if fields.strip() else None
+    if fields is None:
+        return list(FIELD_NAMES)
+    if not isinstance(fields, (list, tuple, set, frozenset)):
+        raise ValueError("fields must be a comma separated string or a list of field names")
+    invalid = [f for f in fields if not isinstance(f, str)]
+    if invalid:
+        raise ValueError(f"Field names must be strings: {', '.join(json.dumps(f) for f in invalid)}")
+    requested = {f.strip() for f in fields if f.strip()}
+    if not requested:
+        raise ValueError("No fields selected")
+    unknown = requested.difference(FIELD_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    for name in list(requested):
+        requested.update(FIELD_DEPENDENCIES.get(name, ()))
+    return [name for name in FIELD_NAMES if name in requested]
+
+
+def resolve_enrichers(enrich: Optional[Iterable[str]]) -> List[str]:
+    """Validate an explicit enricher selection (names from EXPLICIT_ENRICHERS).
+
+    Accepts an iterable of names or a comma separated string; None or a blank string
+    selects none. Raises ValueError on unknown names.
+    """
+    if isinstance(enrich, str):
+        enrich = enrich.split(',')
+    if enrich is None:
+        return []
+    if not isinstance(enrich, (list, tuple, set, frozenset)) or not all(isinstance(e, str) for e in enrich):
+        raise ValueError("enrich must be a comma separated string or a list of enricher names")
+    requested = {e.strip() for e in enrich if e.strip()}
+    unknown = requested.difference(EXPLICIT_ENRICHERS)
+    if unknown:
+        raise ValueError(f"Unknown enrichers: {', '.join(sorted(unknown))}")
+    return [name for name in EXPLICIT_ENRICHERS if name in requested]
+
+
+def enrichers_for(fields: Iterable[str], enrich: Iterable[str] = ()) -> List[str]:
+    """Names (keys of ENRICHERS) of the enrichers a field selection (plus enrich) asks for"""
+    fields = set(fields)
+    enrichers = []
+    if 'doi' in fields or 'datacite' in enrich:
+        enrichers.append('datacite')
+    if 'ip_address' in fields:
+        enrichers.append('reputation')
+    return enrichers
+
+
+def mask_fields(meta: MetaTagData, fields: Iterable[str]) -> MetaTagData:
+    """Reset every field not in fields; enrichment may fill in more than was asked for."""
+    fields = set(fields)
+    if len(fields) < len(FIELD_NAMES):
+        for name in FIELD_NAMES:
+            if name not in fields:
+                setattr(meta, name, [] if isinstance(getattr(meta, name), list) else None)
+    return meta
+
+
+def needs_html(fields: Iterable[str]) -> bool:
+    """True when any of the fields is extracted from the page itself (i.e. the page must be fetched)."""
+    return any(name in HTML_FIELD_EXTRACTORS for name in fields)
+
 
 class MetaTagExtractor:
     """Extracts metadata from HTML meta tags"""
 
-    async def extract(self, html_content: str, url: str) -> MetaTagData:
-        """Extract metadata from HTML meta tags"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        # First, extract from HTML/meta tags as before
-        extracted = MetaTagData(
-            publication_date=self.extract_publication_date(soup),
-            last_modification_date=self.extract_modification_date(soup),
-            author=self.extract_author(soup),
-            authors=self.extract_authors(soup),
-            description=self.extract_description(soup),
-            keywords=self.extract_keywords(soup),
-            publisher=self.extract_publisher(soup),
-            title=self.extract_title(soup),
-            url=url,
-            doi=self.extract_doi(soup, url),
-            language=self.extract_language(soup),
-            content_type=self.extract_content_type(soup),
-            generator=self.extract_generator(soup),
-            viewport=self.extract_viewport(soup),
-            robots=self.extract_robots(soup),
-            refresh=self.extract_refresh(soup)
-        )
+    def __init__(self, limits: Optional[ParseLimits] = None):
+        self.limits = limits or ParseLimits.from_settings()
+        # fields computed by the last extract() call
+        self.computed_fields: List[str] = []
+        # limit ('bytes', 'nodes' or 'time') that cut the last page short, if any
+        self.truncated: Optional[str] = None
+        # <link rel="canonical"> / og:url of the last page, if it declared one
+        self.canonical_url: Optional[str] = None
+        # host whose learned date formats are tried first (set per page by extract_local)
+        self.date_domain: Optional[str] = None
+        # enrichers the last extract() asked for that completed (a failed lookup leaves
+        # the page's own values in place, which must not be cached as the enriched result)
+        self.enriched: List[str] = []
+        # seconds each DataCite/IPQualityScore request may take (the stream lowers it to its
+        # enrichment timeout so a timed-out lookup does not keep its worker thread for longer)
+        self.request_timeout: float = 6
+
+    async def extract(self, html_content: Optional[str], url: str, timer: Optional[StageTimer] = None,
+                      fields: Optional[Iterable[str]] = None, enrich: Iterable[str] = ()) -> MetaTagData:
+        """Extract metadata from HTML meta tags
+
+        Only the requested fields (plus their dependencies) are computed; fields=None
+        computes all of them. DataCite enrichment runs only when 'doi' is selected or
+        enrich names 'datacite' (its metadata then overwrites the other selected fields),
+        and the reputation lookup only when 'reputation' or 'ip_address' is, so their
+        network calls are skipped otherwise. html_content may be None when no HTML field
+        is selected.
+
+        Parsing and extraction are bounded by self.limits; when a limit is hit the fields
+        are extracted from the part of the page that was parsed (or, once the time budget
+        is spent, the remaining fields are left empty) and self.truncated names the limit.
+        Large pages are extracted in a worker thread (see extract_local_async).
+
+        When a StageTimer is passed, the duration of each stage (parse, html, datacite,
+        reputation) is recorded on it.
+        """
+        selected = resolve_fields(fields)
+        timer = timer or StageTimer()
+
+        extracted = await self.extract_local_async(html_content, url, timer=timer, fields=selected, enrich=enrich)
+        failed = []
+        for name in self.pending_enrichers(extracted, selected, enrich):
+            with timer.stage(name):
+                if not getattr(self, ENRICHERS[name])(extracted, url):
+                    failed.append(name)
+        self.enriched = [name for name in enrichers_for(selected, enrich) if name not in failed]
+
+        mask_fields(extracted, selected)
+        return extracted
+
+    def extract_local(self, html_content: Optional[str], url: str, timer: Optional[StageTimer] = None,
+                      fields: Optional[Iterable[str]] = None, enrich: Iterable[str] = ()) -> MetaTagData:
+        """The part of extract() that needs no network call: the fields found in the page itself
+
+        The enrichers named by pending_enrichers() can then be applied to the result. With
+        'datacite' in enrich the page's DOI is extracted for the lookup even when 'doi'
+        isn't selected.
+        """
+        selected = resolve_fields(fields)
+        timer = timer or StageTimer()
+        start = time.perf_counter()
+        budget = self.limits.max_parse_seconds
+
+        values = {'url': url} if 'url' in selected else {}
+        html_fields = [name for name in selected if name in HTML_FIELD_EXTRACTORS]
+        if 'datacite' in enrich and 'doi' not in html_fields:
+            # needed for the DataCite lookup; extract() masks it out again
+            html_fields.append('doi')
+        self.truncated = None
+        self.canonical_url = None
+        self.date_domain = urlparse(url).hostname if url else None
+        if html_fields:
+            with timer.stage('parse'):
+                soup, self.truncated = parse_html(html_content, self.limits)
 
-        # If we have a DOI, prefer authoritative metadata from DataCite API and overwrite fields
-        doi_val = extracted.doi
-        if doi_val:
-            # normalize doi for API path (strip leading doi: if present)
-            norm = doi_val
-            if norm.lower().startswith('doi:'):
-                norm = norm.split(':', 1)[1]
-            # protect slashes while still keeping them (DataCite expects slashes unencoded)
-            api_path = quote(norm, safe='/:')
-            api_url = f'https://api.datacite.org/dois/{api_path}'
             try:
-                resp = requests.get(api_url, timeout=6)
-                if resp.status_code == 200:
-                    j = resp.json()
-                    # traverse to attributes if present
-                    attrs = j.get('data', {}).get('attributes', {}) if isinstance(j, dict) else {}
-                    # Titles -> title (take first)
-                    titles = attrs.get('titles') or []
-                    if titles and isinstance(titles, list):
-                        first = titles[0]
-                        if isinstance(first, dict) and first.get('title'):
-                            extracted.title = first.get('title')
-                        elif isinstance(first, str):
-                            extracted.title = first
-
-                    # Descriptions -> description (prefer Abstract/first descriptionType)
-                    descs = attrs.get('descriptions') or []
-                    if descs and isinstance(descs, list):
-                        # prefer descriptionType == 'Abstract'
-                        picked = None
-                        for d in descs:
-                            if isinstance(d, dict) and d.get('descriptionType', '').lower() == 'abstract' and d.get('description'):
-                                picked = d.get('description'); break
-                        if not picked and isinstance(descs[0], dict):
-                            picked = descs[0].get('description')
-                        if picked:
-                            extracted.description = picked
-
-                    # Publisher
-                    if attrs.get('publisher'):
-                        extracted.publisher = attrs.get('publisher')
-
-                    # Dates: map Issued -> publication_date, Updated -> last_modification_date, Available -> publication_date if missing
-                    dates = attrs.get('dates') or []
-                    for d in dates:
-                        if not isinstance(d, dict):
-                            continue
-                        dt = d.get('date')
-                        dtype = d.get('dateType', '').lower()
-                        if dt and dtype:
-                            if dtype == 'issued':
-                                extracted.publication_date = dt
-                            elif dtype == 'updated':
-                                extracted.last_modification_date = dt
-                            elif dtype == 'available' and not extracted.publication_date:
-                                extracted.publication_date = dt
-
-                    # Creators -> authors list
-                    creators = attrs.get('creators') or []
-                    if creators and isinstance(creators, list):
-                        names = []
-                        for c in creators:
-                            if isinstance(c, dict):
-                                name = c.get('name')
-                                if not name:
-                                    gn = c.get('givenName') or ''
-                                    fn = c.get('familyName') or ''
-                                    name = (gn + ' ' + fn).strip() if (gn or fn) else None
-                                if name:
-                                    names.append(name)
-                            elif isinstance(c, str):
-                                names.append(c)
-                        if names:
-                            extracted.authors = names
-                            extracted.author = names[0]
-
-                    # Subjects -> keywords
-                    subjects = attrs.get('subjects') or []
-                    if subjects and isinstance(subjects, list):
-                        kw = []
-                        for s in subjects:
-                            if isinstance(s, dict):
-                                subj = s.get('subject')
-                            else:
-                                subj = s
-                            if subj:
-                                kw.append(subj)
-                        if kw:
-                            extracted.keywords = kw
-
-                    # Language
-                    if attrs.get('language'):
-                        extracted.language = attrs.get('language')
-
-                    # DOI canonical
-                    if attrs.get('doi'):
-                        extracted.doi = 'doi:' + attrs.get('doi')
-
-                    # Related identifiers: prefer URL or DOI related identifiers to set url/doi
-                    related = attrs.get('relatedIdentifiers') or []
-                    if related and isinstance(related, list):
-                        for r in related:
-                            if not isinstance(r, dict):
+                with timer.stage('html'):
+                    # a per-domain profile (processing/rules.py) goes straight to the
+                    # site's known locations; the generic chain only runs when it misses
+                    rules = get_extraction_rules()
+                    profile = rules.profile_for(url) if rules else None
+                    for name in html_fields:
+                        # the time budget covers the selectors too, not just the parse
+                        if budget and time.perf_counter() - start > budget:
+                            self.truncated = 'time'
+                            break
+                        if profile and name in profile.rules:
+                            value = rules.apply(profile, name, soup, self.normalize_date)
+                            if value or not profile.fallback:
+                                values[name] = value
                                 continue
-                            rtype = (r.get('relatedIdentifierType') or '').upper()
-                            rel = r.get('relatedIdentifier')
-                            if rel and rtype == 'URL' and (not extracted.url or extracted.url == url):
-                                extracted.url = rel
-                            if rel and rtype == 'DOI' and not extracted.doi:
-                                # ensure canonical doi: prefix
-                                val = rel.strip()
-                                if val.lower().startswith('doi:'):
-                                    extracted.doi = val
-                                else:
-                                    extracted.doi = 'doi:' + val
-
-                    # Locations / canonical URL: DataCite sometimes exposes locations/associatedLocations or landingPage-like fields
-                    # prefer attrs['url'] or attrs['locations'] if present
-                    if not extracted.url:
-                        # try a few common fields
-                        url_field = attrs.get('url') or attrs.get('landingPage') or None
-                        if url_field and isinstance(url_field, str):
-                            extracted.url = url_field
-                        else:
-                            locs = attrs.get('locations') or []
-                            if isinstance(locs, list) and locs:
-                                # try to pick the first location with a 'url' key
-                                for loc in locs:
-                                    if isinstance(loc, dict) and loc.get('url'):
-                                        extracted.url = loc.get('url')
-                                        break
-
-                    # Publication year fallback
-                    if not extracted.publication_date and attrs.get('publicationYear'):
-                        extracted.publication_date = str(attrs.get('publicationYear'))
-
-                    # Types -> content_type or resource type general
-                    types = attrs.get('types') or {}
-                    if isinstance(types, dict):
-                        extracted.content_type = types.get('resourceTypeGeneral') or types.get('citeproc') or types.get('ris')
-
-                    # Contributors -> could be added to keywords or ignored; here we append their names to keywords as informative data
-                    contributors = attrs.get('contributors') or []
-                    if contributors and isinstance(contributors, list):
-                        contrib_names = []
-                        for c in contributors:
-                            if isinstance(c, dict):
-                                n = c.get('name')
-                                if n:
-                                    contrib_names.append(n)
-                        if contrib_names:
-                            extracted.keywords = (extracted.keywords or []) + contrib_names
-            except Exception:
-                # On network errors or parsing errors, fall back to extracted HTML metadata
-                pass
-
-        # After enrichment, attempt to get IP reputation using IPQualityScore (if API key configured)
+                        method = getattr(self, HTML_FIELD_EXTRACTORS[name])
+                        values[name] = method(soup, url) if name == 'doi' else method(soup)
+                    else:
+                        self.canonical_url = self.extract_canonical_url(soup, url)
+            finally:
+                # break the tree's reference cycles so its memory is released right away
+                soup.decompose()
+                del soup
+        self.computed_fields = selected
+        self.enriched = []
+        return MetaTagData(**values)
+
+    async def extract_local_async(self, html_content: Optional[str], url: str,
+                                  timer: Optional[StageTimer] = None,
+                                  fields: Optional[Iterable[str]] = None, enrich: Iterable[str] = ()) -> MetaTagData:
+        """extract_local, run in a worker thread for pages over limits.inline_bytes"""
+        inline = self.limits.inline_bytes
+        if html_content and inline and len(html_content) > inline:
+            return await asyncio.to_thread(self.extract_local, html_content, url, timer, fields, enrich)
+        return self.extract_local(html_content, url, timer=timer, fields=fields, enrich=enrich)
+
+    def pending_enrichers(self, extracted: MetaTagData, fields: Iterable[str], enrich: Iterable[str] = ()) -> List[str]:
+        """Names (keys of ENRICHERS) of the enrichers that apply to a locally extracted result"""
+        requested = enrichers_for(fields, enrich)
+        pending = []
+        # If we have a DOI, prefer authoritative metadata from DataCite API and overwrite fields
+        if extracted.doi and 'datacite' in requested:
+            pending.append('datacite')
+        if 'reputation' in requested:
+            pending.append('reputation')
+        return pending
+
+    def enrich_datacite(self, extracted: MetaTagData, url: str) -> bool:
+        """Overwrite fields with DataCite metadata for the extracted DOI; never raises
+
+        Returns False when the lookup failed (the HTML metadata is kept then).
+        """
+        try:
+            attrs = self.fetch_datacite_attributes(extracted.doi)
+            if attrs:
+                self.apply_datacite_attributes(extracted, attrs, url)
+            return True
+        except Exception:
+            # On network errors or parsing errors, fall back to extracted HTML metadata
+            return False
+
+    def enrich_reputation(self, extracted: MetaTagData, url: str) -> bool:
+        """Resolve the page's host and attach its IP and reputation; never raises
+
+        The local blocklist index (REPUTATION_* settings) is consulted first; IPQualityScore
+        is only called (when an API key is configured) for IPs the local lists don't flag.
+        Returns False when the lookup failed.
+        """
         try:
+            index = get_reputation_index()
             api_key = os.environ.get('ipqualityscore_api_key')
-            if api_key:
-                # derive hostname from the original URL
-                parsed = urlparse(url)
-                host = parsed.hostname if parsed else None
-                if host:
-                    try:
-                        ips = resolve_ips(host, prefer_ipv4=True)
-                        if ips:
-                            # store the primary IP on the meta object
-                            extracted.ip_address = ips[0]
-                            # query the first IP for a compact summary; do not raise on failure
-                            try:
-                                rep = reputation_summary(api_key, ips[0], strict=False, timeout=6)
-                                extracted.reputation = rep
-                            except Exception:
-                                extracted.reputation = None
-                    except Exception:
-                        extracted.reputation = None
+            if not (index or api_key):
+                return True
+            from src.backend.craap.processing.check_reputation import resolve_ips
+
+            # derive hostname from the original URL
+            parsed = urlparse(url)
+            host = parsed.hostname if parsed else None
+            if not host:
+                return True
+            ips = resolve_ips(host, prefer_ipv4=True)
+            if not ips:
+                return True
+            # store the primary IP on the meta object
+            extracted.ip_address = ips[0]
+
+            local = index.lookup(ips[0]) if index else None
+            if local and local['listed']:
+                extracted.reputation = local
+                return True
+            # query the first IP for a compact summary; do not raise on failure
+            rep = self.lookup_reputation(api_key, ips[0]) if api_key else None
+            if rep and index:
+                rep = {**rep, 'asn_listed': index.asn_listed(rep.get('ASN'))}
+            extracted.reputation = rep or local
+            return True
         except Exception:
             # ensure extractor never raises due to reputation lookup
             extracted.reputation = None
-
-        return extracted
+            return False
+
+    def lookup_reputation(self, api_key: str, ip: str) -> Optional[dict]:
+        """Return the IPQualityScore summary for an IP, served from the shared cache when possible"""
+        cache = get_cache()
+        cache_key = f'ipqs:{ip}'
+        cached = cache.get_json(cache_key)
+        if cached is not None:
+            return cached
+        from src.backend.craap.processing.check_reputation import IPQS_API_URL, reputation_summary
+
+        rep = reputation_summary(api_key, ip, strict=False, timeout=self.request_timeout,
+                                 base_url=setting('IPQS_API_URL', IPQS_API_URL))
+        if rep is not None:
+            cache.set_json(cache_key, rep, ttl=cache_ttl('enrichment'))
+        return rep
+
+    def fetch_datacite_attributes(self, doi: str) -> Optional[dict]:
+        """Fetch the DataCite ``attributes`` record for a DOI.
+
+        Results (including "not found") are kept in the shared cache so repeated
+        analyses of the same DOI don't call the DataCite API again.
+        """
+        # normalize doi for API path (strip leading doi: if present)
+        norm = doi
+        if norm.lower().startswith('doi:'):
+            norm = norm.split(':', 1)[1]
+        cache = get_cache()
+        cache_key = f'datacite:{norm.lower()}'
+        cached = cache.get_json(cache_key)
+        if cached is not None:
+            return cached or None
+
+        import requests
+
+        # protect slashes while still keeping them (DataCite expects slashes unencoded)
+        api_path = quote(norm, safe='/:')
+        base_url = setting('DATACITE_API_URL', 'https://api.datacite.org').rstrip('/')
+        api_url = f'{base_url}/dois/{api_path}'
+        resp = requests.get(api_url, timeout=self.request_timeout)
+        if resp.status_code == 404:
+            cache.set_json(cache_key, {}, ttl=cache_ttl('enrichment'))
+            return None
+        if resp.status_code != 200:
+            return None
+        j = resp.json()
+        # traverse to attributes if present
+        attrs = j.get('data', {}).get('attributes', {}) if isinstance(j, dict) else {}
+        cache.set_json(cache_key, attrs or {}, ttl=cache_ttl('enrichment'))
+        return attrs or None
+
+    def apply_datacite_attributes(self, extracted: MetaTagData, attrs: dict, url: str) -> None:
+        """Overwrite fields of extracted with the authoritative DataCite metadata"""
+        # Titles -> title (take first)
+        titles = attrs.get('titles') or []
+        if titles and isinstance(titles, list):
+            first = titles[0]
+            if isinstance(first, dict) and first.get('title'):
+                extracted.title = first.get('title')
+            elif isinstance(first, str):
+                extracted.title = first
+
+        # Descriptions -> description (prefer Abstract/first descriptionType)
+        descs = attrs.get('descriptions') or []
+        if descs and isinstance(descs, list):
+            # prefer descriptionType == 'Abstract'
+            picked = None
+            for d in descs:
+                if isinstance(d, dict) and d.get('descriptionType', '').lower() == 'abstract' and d.get('description'):
+                    picked = d.get('description'); break
+            if not picked and isinstance(descs[0], dict):
+                picked = descs[0].get('description')
+            if picked:
+                extracted.description = picked
+
+        # Publisher
+        if attrs.get('publisher'):
+            extracted.publisher = attrs.get('publisher')
+
+        # Dates: map Issued -> publication_date, Updated -> last_modification_date, Available -> publication_date if missing
+        dates = attrs.get('dates') or []
+        for d in dates:
+            if not isinstance(d, dict):
+                continue
+            # DataCite dates vary in precision (2024, 2024-03, ranges); normalized like page dates,
+            # and kept as published when they aren't a parseable date ("Spring 2019")
+            raw = d.get('date')
+            dt = get_date_normalizer().normalize(raw, 'api.datacite.org') or (str(raw).strip() if raw else None)
+            dtype = d.get('dateType', '').lower()
+            if dt and dtype:
+                if dtype == 'issued':
+                    extracted.publication_date = dt
+                elif dtype == 'updated':
+                    extracted.last_modification_date = dt
+                elif dtype == 'available' and not extracted.publication_date:
+                    extracted.publication_date = dt
+
+        # Creators -> authors list
+        creators = attrs.get('creators') or []
+        if creators and isinstance(creators, list):
+            names = []
+            for c in creators:
+                if isinstance(c, dict):
+                    name = c.get('name')
+                    if not name:
+                        gn = c.get('givenName') or ''
+                        fn = c.get('familyName') or ''
+                        name = (gn + ' ' + fn).strip() if (gn or fn) else None
+                    if name:
+                        names.append(name)
+                elif isinstance(c, str):
+                    names.append(c)
+            if names:
+                extracted.authors = names
+                extracted.author = names[0]
+
+        # Subjects -> keywords
+        subjects = attrs.get('subjects') or []
+        if subjects and isinstance(subjects, list):
+            kw = []
+            for s in subjects:
+                if isinstance(s, dict):
+                    subj = s.get('subject')
+                else:
+                    subj = s
+                if subj:
+                    kw.append(subj)
+            if kw:
+                extracted.keywords = kw
+
+        # Language
+        if attrs.get('language'):
+            extracted.language = attrs.get('language')
+
+        # DOI canonical
+        if attrs.get('doi'):
+            extracted.doi = 'doi:' + attrs.get('doi')
+
+        # Related identifiers: prefer URL or DOI related identifiers to set url/doi
+        related = attrs.get('relatedIdentifiers') or []
+        if related and isinstance(related, list):
+            for r in related:
+                if not isinstance(r, dict):
+                    continue
+                rtype = (r.get('relatedIdentifierType') or '').upper()
+                rel = r.get('relatedIdentifier')
+                if rel and rtype == 'URL' and (not extracted.url or extracted.url == url):
+                    extracted.url = rel
+                if rel and rtype == 'DOI' and not extracted.doi:
+                    # ensure canonical doi: prefix
+                    val = rel.strip()
+                    if val.lower().startswith('doi:'):
+                        extracted.doi = val
+                    else:
+                        extracted.doi = 'doi:' + val
+
+        # Locations / canonical URL: DataCite sometimes exposes locations/associatedLocations or landingPage-like fields
+        # prefer attrs['url'] or attrs['locations'] if present
+        if not extracted.url:
+            # try a few common fields
+            url_field = attrs.get('url') or attrs.get('landingPage') or None
+            if url_field and isinstance(url_field, str):
+                extracted.url = url_field
+            else:
+                locs = attrs.get('locations') or []
+                if isinstance(locs, list) and locs:
+                    # try to pick the first location with a 'url' key
+                    for loc in locs:
+                        if isinstance(loc, dict) and loc.get('url'):
+                            extracted.url = loc.get('url')
+                            break
+
+        # Publication year fallback
+        if not extracted.publication_date and attrs.get('publicationYear'):
+            year = str(attrs.get('publicationYear')).strip()
+            extracted.publication_date = get_date_normalizer().normalize(year) or year
+
+        # Types -> content_type or resource type general
+        types = attrs.get('types') or {}
+        if isinstance(types, dict):
+            extracted.content_type = types.get('resourceTypeGeneral') or types.get('citeproc') or types.get('ris')
+
+        # Contributors -> could be added to keywords or ignored; here we append their names to keywords as informative data
+        contributors = attrs.get('contributors') or []
+        if contributors and isinstance(contributors, list):
+            contrib_names = []
+            for c in contributors:
+                if isinstance(c, dict):
+                    n = c.get('name')
+                    if n:
+                        contrib_names.append(n)
+            if contrib_names:
+                extracted.keywords = (extracted.keywords or []) + contrib_names
 
     def extract_publication_date(self, soup: BeautifulSoup) -> Optional[str]:
         """Extract publication date from meta tags"""
@@ -241,9 +528,9 @@ class MetaTagExtractor:
             if element:
                 date_value = element.get('content') or element.get('datetime')
                 if date_value:
-                    parsed_date = self.parse_date(date_value)
-                    if parsed_date:
-                        return parsed_date.isoformat()
+                    normalized = self.normalize_date(date_value)
+                    if normalized:
+                        return normalized
         return None
 
     def extract_modification_date(self, soup: BeautifulSoup) -> Optional[str]:
@@ -258,9 +545,9 @@ class MetaTagExtractor:
         for selector in date_selectors:
             element = soup.select_one(selector)
             if element and (date_value := element.get('content')):
-                parsed_date = self.parse_date(date_value)
-                if parsed_date:
-                    return parsed_date.isoformat()
+                normalized = self.normalize_date(date_value)
+                if normalized:
+                    return normalized
         return None
 
     def extract_author(self, soup: BeautifulSoup) -> Optional[str]:
@@ -352,6 +639,16 @@ class MetaTagExtractor:
                     return title.strip()
         return None
 
+    def extract_canonical_url(self, soup: BeautifulSoup, page_url: str) -> Optional[str]:
+        """Extract the canonical URL from <link rel="canonical"> or og:url, made absolute"""
+        link = soup.find('link', rel='canonical', href=True)
+        if link and link['href'].strip():
+            return urljoin(page_url, link['href'].strip())
+        og_url = soup.find('meta', attrs={'property': 'og:url'})
+        if og_url and (content := og_url.get('content')) and content.strip():
+            return urljoin(page_url, content.strip())
+        return None
+
     def extract_language(self, soup: BeautifulSoup) -> Optional[str]:
         """Extract language from meta tags and html lang attribute"""
         # From meta tags
@@ -402,11 +699,12 @@ class MetaTagExtractor:
         return None
 
     def parse_date(self, date_string: str) -> Optional[datetime]:
-        """Parse various date formats into datetime object"""
-        try:
-            return dateutil.parser.parse(date_string)
-        except (ValueError, TypeError):
-            return None
+        """Parse various date formats into datetime object (see processing/dates.py)"""
+        return get_date_normalizer().parse(date_string, self.date_domain)
+
+    def normalize_date(self, date_string: Optional[str]) -> Optional[str]:
+        """ISO 8601 form of a date string, or None when it isn't a date"""
+        return get_date_normalizer().normalize(date_string, self.date_domain)
 
     def extract_doi(self, soup: BeautifulSoup, page_url: str) -> Optional[str]:
         """Attempt to extract a DOI from meta tags, links, or page text.
@@ -480,13 +778,12 @@ class MetaTagExtractor:
                     continue
 
         # fallback: search page text for DOI pattern 10.<digits>/<suffix>
-        # build a whitespace-joined, stripped text using stripped_strings to avoid signature issues
-        text = ' '.join(soup.stripped_strings)
-        import re
-        # basic DOI regex (not exhaustive but practical)
-        m = re.search(r'\b(10\.\d{4,9}/\S+?)\b', text)
-        if m:
-            return m.group(1).rstrip('.,;')
+        # each text node is searched on its own instead of joining the whole page text into
+        # one more page-sized string (a DOI can't span nodes: the pattern stops at whitespace)
+        for text in soup.stripped_strings:
+            m = DOI_PATTERN.search(text)
+            if m:
+                return m.group(1).rstrip('.,;')
 
         # If no DOI found, return the page URL as a fallback
         return None
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""Site-level discovery: metadata from sitemaps and RSS/Atom feeds.
+
+Given a site, ``SiteCrawler`` finds its sitemaps (``Sitemap:`` lines in robots.txt, or
+``/sitemap.xml``) and feeds (``<link rel="alternate">`` on the home page) and turns their
+entries into MetaTagData without fetching the articles: sitemaps give the URL and
+``lastmod`` (plus title, publication date, publisher, language and keywords in Google News
+sitemaps), RSS items and Atom entries give title, dates, authors, description and
+categories. Sitemap indexes are followed and gzipped documents are decompressed on the
+fly.
+
+Documents are parsed incrementally while they download (``FeedParser``) and every entry
+is dropped from the tree once it has been converted, so a sitemap with 50 000 URLs never
+sits in memory as a whole. Article pages are only fetched when asked to
+(``fetch_missing``), and then only for entries lacking one of the requested fields.
+
+Usage:
+    python -m src.backend.craap.processing.feeds example.com --limit 100 > entries.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import html
+import logging
+import re
+import sys
+import zlib
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from xml.etree import ElementTree
+
+from src.backend.craap.config import setting
+from src.backend.craap.model.data_model import FetchedPage, MetaTagData
+from src.backend.craap.processing.canonical import canonicalize_url, same_site
+from src.backend.craap.processing.extractor import MetaTagExtractor, mask_fields, needs_html, resolve_fields
+from src.backend.craap.processing.limits import decode_body, read_body
+
+logger = logging.getLogger(__name__)
+
+# fields sitemaps and feeds can provide; the default selection in site mode
+FEED_FIELDS = (
+    'publication_date', 'last_modification_date', 'author', 'authors', 'description',
+    'keywords', 'publisher', 'title', 'url', 'language',
+)
+
+FEED_TYPES = ('application/rss+xml', 'application/atom+xml', 'application/feed+xml')
+
+USER_AGENT = 'Mozilla/5.0 (compatible; MetaCheck; +https://github.com/amalkhair/MetaCheck)'
+
+# decompressed output is produced in slices of this size, so a small gzip body can't
+# expand into one huge buffer
+_INFLATE_CHUNK = 1 << 20
+
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+_SPACE_PATTERN = re.compile(r'\s+')
+
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+# what FeedParser yields: ('sitemap', url) for a nested sitemap, ('entry', MetaTagData)
+Item = Tuple[str, Any]
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition('}')[2] if isinstance(tag, str) else ''
+
+
+def _child(elem, name: str):
+    for child in elem:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _children(elem, name: str) -> list:
+    return [child for child in elem if _local(child.tag) == name]
+
+
+def _text(elem) -> Optional[str]:
+    if elem is None:
+        return None
+    text = ''.join(elem.itertext()).strip()
+    return text or None
+
+
+def _plain(text: Optional[str]) -> Optional[str]:
+    # RSS descriptions usually carry (escaped) HTML
+    if not text:
+        return None
+    text = _SPACE_PATTERN.sub(' ', html.unescape(_TAG_PATTERN.sub(' ', text))).strip()
+    return text or None
+
+
+def _dedupe(values: List[str]) -> List[str]:
+    seen = set()
+    return [v for v in values if v and not (v in seen or seen.add(v))]
+
+
+class FeedParser:
+    """Incremental parser for sitemaps, sitemap indexes, RSS and Atom documents.
+
+    Feed raw (possibly gzipped) chunks with ``feed`` and collect the items it yields; call
+    ``close`` at the end. ``max_bytes`` bounds the decompressed document size.
+    """
+
+    def __init__(self, base_url: str, normalize_date: Callable[[str], Optional[str]], max_bytes: int = 50_000_000):
+        self.base_url = base_url
+        self.normalize_date = normalize_date
+        self.max_bytes = max_bytes
+        self.kind: Optional[str] = None  # root element: urlset, sitemapindex, rss, feed or RDF
+        self.bytes_parsed = 0
+        # channel/feed-level title and language, the defaults for publisher and language
+        self.channel: Dict[str, str] = {}
+        self._parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        self._stack: list = []
+        self._inflater = None
+        self._started = False
+
+    def feed(self, chunk: bytes) -> Iterator[Item]:
+        if not self._started:
+            self._started = True
+            if chunk[:2] == b'\x1f\x8b':
+                self._inflater = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        if self._inflater is None:
+            yield from self._parse(chunk)
+            return
+        data = self._inflater.decompress(chunk, _INFLATE_CHUNK)
+        while data:
+            yield from self._parse(data)
+            tail = self._inflater.unconsumed_tail
+            data = self._inflater.decompress(tail, _INFLATE_CHUNK) if tail else b''
+
+    def close(self) -> Iterator[Item]:
+        self._parser.close()
+        yield from self._events()
+
+    def _parse(self, data: bytes) -> Iterator[Item]:
+        self.bytes_parsed += len(data)
+        if self.max_bytes and self.bytes_parsed > self.max_bytes:
+            raise ValueError(f"{self.base_url} exceeds {self.max_bytes} bytes")
+        self._parser.feed(data)
+        yield from self._events()
+
+    def _events(self) -> Iterator[Item]:
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if not self._stack:
+                    self.kind = _local(elem.tag)
+                    # an Atom feed's xml:lang applies to entries that don't set their own
+                    if self.kind == 'feed' and elem.get(XML_LANG):
+                        self.channel['language'] = elem.get(XML_LANG)
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            parent = self._stack[-1] if self._stack else None
+            name = _local(elem.tag)
+            item = None
+            if name == 'url' and self.kind == 'urlset':
+                item = self._sitemap_entry(elem)
+            elif name == 'sitemap' and self.kind == 'sitemapindex':
+                loc = _text(_child(elem, 'loc'))
+                item = ('sitemap', urljoin(self.base_url, loc)) if loc else None
+            elif name == 'item':
+                item = self._rss_entry(elem)
+            elif name == 'entry' and self.kind == 'feed':
+                item = self._atom_entry(elem)
+            elif parent is not None and _local(parent.tag) in ('channel', 'feed'):
+                # header elements come before the entries
+                if name == 'title' and 'publisher' not in self.channel:
+                    self.channel['publisher'] = _text(elem)
+                elif name == 'language':
+                    self.channel['language'] = _text(elem)
+                continue
+            else:
+                continue
+            # converted entries are dropped from the tree to keep memory flat
+            if parent is not None:
+                parent.remove(elem)
+            if item is not None:
+                yield item
+
+    def _date(self, text: Optional[str]) -> Optional[str]:
+        return self.normalize_date(text) if text else None
+
+    def _entry(self, values: Dict[str, Any]) -> Optional[Item]:
+        if not values.get('url'):
+            return None
+        authors = _dedupe(values.get('authors') or [])
+        values['authors'] = authors
+        values['author'] = values.get('author') or (authors[0] if authors else None)
+        values['keywords'] = _dedupe(values.get('keywords') or [])
+        values.setdefault('publisher', self.channel.get('publisher'))
+        values['language'] = values.get('language') or self.channel.get('language')
+        return 'entry', MetaTagData(**values)
+
+    def _sitemap_entry(self, elem) -> Optional[Item]:
+        loc = _text(_child(elem, 'loc'))
+        values = {
+            'url': urljoin(self.base_url, loc) if loc else None,
+            'last_modification_date': self._date(_text(_child(elem, 'lastmod'))),
+        }
+        # Google News sitemap extension
+        news = _child(elem, 'news')
+        if news is not None:
+            publication = _child(news, 'publication')
+            values.update({
+                'title': _text(_child(news, 'title')),
+                'publication_date': self._date(_text(_child(news, 'publication_date'))),
+                'keywords': [k.strip() for k in (_text(_child(news, 'keywords')) or '').split(',')],
+            })
+            if publication is not None:
+                values['publisher'] = _text(_child(publication, 'name'))
+                values['language'] = _text(_child(publication, 'language'))
+        return self._entry(values)
+
+    def _rss_entry(self, elem) -> Optional[Item]:
+        link = _text(_child(elem, 'link'))
+        guid = _child(elem, 'guid')
+        if not link and guid is not None and guid.get('isPermaLink', 'true') != 'false':
+            link = _text(guid)
+        authors = [_text(a) for a in _children(elem, 'creator') + _children(elem, 'author')]
+        return self._entry({
+            'url': urljoin(self.base_url, link) if link else None,
+            'title': _plain(_text(_child(elem, 'title'))),
+            'publication_date': self._date(_text(_child(elem, 'pubDate')) or _text(_child(elem, 'date'))),
+            'last_modification_date': self._date(_text(_child(elem, 'updated')) or _text(_child(elem, 'modified'))),
+            'authors': [a.strip() for author in authors if author for a in author.split(',')],
+            'description': _plain(_text(_child(elem, 'description'))),
+            'keywords': [_text(c) for c in _children(elem, 'category') + _children(elem, 'subject')],
+        })
+
+    def _atom_entry(self, elem) -> Optional[Item]:
+        link = None
+        for candidate in _children(elem, 'link'):
+            if candidate.get('rel', 'alternate') == 'alternate' and candidate.get('href'):
+                link = candidate.get('href')
+                break
+        return self._entry({
+            'url': urljoin(self.base_url, link) if link else None,
+            'title': _plain(_text(_child(elem, 'title'))),
+            'publication_date': self._date(_text(_child(elem, 'published'))),
+            'last_modification_date': self._date(_text(_child(elem, 'updated'))),
+            'authors': [_text(_child(a, 'name')) for a in _children(elem, 'author')],
+            'description': _plain(_text(_child(elem, 'summary'))),
+            'keywords': [c.get('term') for c in _children(elem, 'category')],
+            'language': elem.get(XML_LANG),
+        })
+
+
+def site_root(site: str) -> str:
+    """Base URL (scheme://host/) for a domain or any URL on the site."""
+    if '://' not in site:
+        site = f'http://{site}'
+    parts = urlsplit(site)
+    return f'{parts.scheme}://{parts.netloc}/'
+
+
+@dataclasses.dataclass
+class SiteLimits:
+    max_documents: int = 50
+    max_entries: int = 1000
+    max_page_fetches: int = 100
+    max_document_bytes: int = 50_000_000
+    fetch_concurrency: int = 4
+
+    @classmethod
+    def from_settings(cls) -> 'SiteLimits':
+        defaults = cls()
+        return cls(
+            max_documents=int(setting('SITE_MAX_DOCUMENTS', defaults.max_documents)),
+            max_entries=int(setting('SITE_MAX_ENTRIES', defaults.max_entries)),
+            max_page_fetches=int(setting('SITE_MAX_PAGE_FETCHES', defaults.max_page_fetches)),
+            max_document_bytes=int(setting('SITE_MAX_DOCUMENT_BYTES', defaults.max_document_bytes)),
+            fetch_concurrency=int(setting('SITE_FETCH_CONCURRENCY', defaults.fetch_concurrency)),
+        )
+
+
+class SiteCrawler:
+    """Discovers a site's sitemaps and feeds and yields MetaTagData for their entries.
+
+    fetch_page (e.g. api.v1.analyzer.fetch_page) is used to fill in fields an entry lacks
+    when fetch_missing is set; without it no article page is ever requested.
+    """
+
+    def __init__(self, site: str, fields: Optional[List[str]] = None,
+                 fetch_page: Optional[Callable[[str], Awaitable[FetchedPage]]] = None,
+                 fetch_missing: bool = False, limits: Optional[SiteLimits] = None):
+        self.root = site_root(site)
+        self.fields = resolve_fields(fields if fields is not None else FEED_FIELDS)
+        self.fetch_page = fetch_page
+        self.fetch_missing = fetch_missing and fetch_page is not None
+        self.limits = limits or SiteLimits.from_settings()
+        self.extractor = MetaTagExtractor()
+        # a site's feeds use the same few date formats, learned once per crawl
+        self.extractor.date_domain = urlsplit(self.root).hostname
+        self.sitemaps: List[str] = []
+        self.feeds: List[str] = []
+        self.documents_read = 0
+        self.pages_fetched = 0
+
+    async def _get(self, session, url: str) -> Optional[str]:
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                body = await read_body(response, self.limits.max_document_bytes)
+                return decode_body(body, response.charset)
+        except Exception:
+            return None
+
+    async def discover(self) -> Tuple[List[str], List[str]]:
+        """Find the site's sitemaps and feeds; returns (sitemaps, feeds)."""
+        import aiohttp
+
+        async with aiohttp.ClientSession(headers={'User-Agent': USER_AGENT},
+                                         timeout=aiohttp.ClientTimeout(total=30)) as session:
+            robots, home = await asyncio.gather(
+                self._get(session, urljoin(self.root, '/robots.txt')),
+                self._get(session, self.root),
+            )
+        for line in (robots or '').splitlines():
+            key, _, value = line.partition(':')
+            if key.strip().lower() == 'sitemap' and value.strip():
+                self.sitemaps.append(urljoin(self.root, value.strip()))
+        if not self.sitemaps:
+            self.sitemaps.append(urljoin(self.root, '/sitemap.xml'))
+        if home:
+            self.feeds = self._feed_links(home)
+        return self.sitemaps, self.feeds
+
+    def _feed_links(self, page: str) -> List[str]:
+        from src.backend.craap.processing.limits import parse_html
+
+        soup, _ = parse_html(page, self.extractor.limits)
+        try:
+            links = [
+                urljoin(self.root, link['href'])
+                for link in soup.select('link[rel~="alternate"][href]')
+                if (link.get('type') or '').split(';')[0].strip().lower() in FEED_TYPES
+            ]
+        finally:
+            soup.decompose()
+        return _dedupe(links)
+
+    async def entries(self) -> AsyncIterator[MetaTagData]:
+        """Yield one MetaTagData per entry (feeds first, then sitemaps), each URL once."""
+        import aiohttp
+
+        if not (self.sitemaps or self.feeds):
+            await self.discover()
+        # feeds come first: their entries are richer than bare sitemap URLs
+        queue = list(self.feeds) + list(self.sitemaps)
+        seen_documents = set(queue)
+        seen_urls = set()
+        emitted = 0
+        pending: List[MetaTagData] = []
+
+        async with aiohttp.ClientSession(headers={'User-Agent': USER_AGENT},
+                                         timeout=aiohttp.ClientTimeout(total=120)) as session:
+            while queue and self.documents_read < self.limits.max_documents:
+                document = queue.pop(0)
+                self.documents_read += 1
+                async with aclosing(self._read_document(session, document)) as items:
+                    async for kind, value in items:
+                        if kind == 'sitemap':
+                            if value not in seen_documents:
+                                seen_documents.add(value)
+                                queue.append(value)
+                            continue
+                        key = canonicalize_url(value.url)
+                        if key in seen_urls or not same_site(value.url, self.root):
+                            continue
+                        seen_urls.add(key)
+                        if self._missing(value):
+                            pending.append(value)
+                            if len(pending) >= self.limits.fetch_concurrency:
+                                for meta in await self._complete(pending):
+                                    yield meta
+                                pending = []
+                        else:
+                            yield mask_fields(value, self.fields)
+                        emitted += 1
+                        if emitted >= self.limits.max_entries:
+                            break
+                if emitted >= self.limits.max_entries:
+                    break
+        for meta in await self._complete(pending):
+            yield meta
+
+    async def _read_document(self, session, url: str) -> AsyncIterator[Item]:
+        parser = FeedParser(url, self.extractor.normalize_date, self.limits.max_document_bytes)
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return
+                async for chunk in response.content.iter_chunked(65536):
+                    for item in parser.feed(chunk):
+                        yield item
+            for item in parser.close():
+                yield item
+        except (ElementTree.ParseError, ValueError, zlib.error) as e:
+            # a broken or oversized document ends that document, not the crawl
+            logger.warning(f"Skipping the rest of {url}: {e}")
+        except Exception:
+            return
+
+    def _missing(self, meta: MetaTagData) -> List[str]:
+        if not self.fetch_missing or self.pages_fetched >= self.limits.max_page_fetches:
+            return []
+        return [name for name in self.fields if name != 'url' and not getattr(meta, name)]
+
+    async def _complete(self, entries: List[MetaTagData]) -> List[MetaTagData]:
+        """Fetch the pages of entries to fill in the fields their feed entry lacked."""
+        async def fill(meta: MetaTagData) -> MetaTagData:
+            missing = self._missing(meta)
+            if missing:
+                self.pages_fetched += needs_html(missing)
+                try:
+                    page = await self.fetch_page(meta.url) if needs_html(missing) else None
+                    found = await MetaTagExtractor().extract(page.html if page else None, meta.url, fields=missing)
+                    for name in missing:
+                        setattr(meta, name, getattr(found, name))
+                except Exception:
+                    # the feed entry is still worth returning without the page's fields
+                    pass
+            return mask_fields(meta, self.fields)
+
+        return list(await asyncio.gather(*(fill(meta) for meta in entries)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Print MetaTagData (JSON lines) for a site's sitemap and feed entries")
+    parser.add_argument('site', help='Domain or URL of the site')
+    parser.add_argument('--fields', help='Comma separated MetaTagData fields (default: what feeds provide)')
+    parser.add_argument('--limit', type=int, help='Maximum number of entries')
+    parser.add_argument('--fetch-missing', action='store_true', help='Fetch pages for fields an entry lacks')
+    args = parser.parse_args(argv)
+
+    limits = SiteLimits.from_settings()
+    if args.limit:
+        limits.max_entries = args.limit
+    fetch_page = None
+    if args.fetch_missing:
+        from src.backend.craap.api.v1.analyzer import fetch_page
+
+    async def run() -> int:
+        crawler = SiteCrawler(args.site, fields=args.fields.split(',') if args.fields else None,
+                              fetch_page=fetch_page, fetch_missing=args.fetch_missing, limits=limits)
+        sitemaps, feeds = await crawler.discover()
+        print(f"sitemaps: {sitemaps}\nfeeds: {feeds}", file=sys.stderr)
+        count = 0
+        async for meta in crawler.entries():
+            print(crawler.extractor.convert_to_json(meta, indent=None))
+            count += 1
+        print(f"{count} entries from {crawler.documents_read} documents, "
+              f"{crawler.pages_fetched} pages fetched", file=sys.stderr)
+        return 0
+
+    try:
+        return asyncio.run(run())
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+"""Resource limits for parsing untrusted pages.
+
+A very large page, or one with hundreds of thousands of elements, turns into a huge
+BeautifulSoup tree. ``parse_html`` bounds the work done per page: the input is cut to
+``max_bytes``, parsing stops after ``max_nodes`` elements or ``max_parse_seconds``, and
+whatever was parsed up to that point is returned together with the reason it was
+truncated so the extractor can still produce a (partial) result. ``max_parse_seconds``
+is the budget for parsing and extracting together: the extractor stops selecting fields
+once it is spent. Pages over ``inline_bytes`` are extracted in a worker thread so a slow
+page doesn't hold up the event loop.
+"""
+import codecs
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from src.backend.craap.config import setting
+
+
+@dataclass
+class ParseLimits:
+    """Per-page limits; 0 disables a limit"""
+    max_bytes: int = 5_000_000
+    max_nodes: int = 50_000
+    max_parse_seconds: float = 5.0
+    inline_bytes: int = 200_000
+
+    @classmethod
+    def from_settings(cls) -> "ParseLimits":
+        defaults = cls()
+        return cls(
+            max_bytes=int(setting("MAX_HTML_BYTES", defaults.max_bytes)),
+            max_nodes=int(setting("MAX_HTML_NODES", defaults.max_nodes)),
+            max_parse_seconds=float(setting("MAX_PARSE_SECONDS", defaults.max_parse_seconds)),
+            inline_bytes=int(setting("MAX_INLINE_HTML_BYTES", defaults.inline_bytes)),
+        )
+
+
+def truncate_html(html: str, max_bytes: int) -> Tuple[str, bool]:
+    """Cut html so that its UTF-8 encoding is at most max_bytes; returns (html, truncated)."""
+    if not max_bytes:
+        return html, False
+    truncated = False
+    # a character is at least one byte, so anything past max_bytes characters is over the limit
+    if len(html) > max_bytes:
+        html = html[:max_bytes]
+        truncated = True
+    # only encode when the text could be over the limit (UTF-8 uses at most 4 bytes per character)
+    if len(html) * 4 > max_bytes:
+        data = html.encode("utf-8", "ignore")
+        if len(data) > max_bytes:
+            html = data[:max_bytes].decode("utf-8", "ignore")
+            truncated = True
+    return html, truncated
+
+
+class _LimitReached(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+@lru_cache(maxsize=1)
+def _bounded_soup_class():
+    # built on first use so importing this module doesn't import bs4
+    from bs4 import BeautifulSoup
+
+    class BoundedSoup(BeautifulSoup):
+        """BeautifulSoup that stops building the tree once a node or time budget is spent."""
+
+        def __init__(self, markup, features, limits: ParseLimits):
+            self.limits = limits
+            self.truncated: Optional[str] = None
+            self._nodes = 0
+            self._deadline = time.perf_counter() + limits.max_parse_seconds if limits.max_parse_seconds else None
+            super().__init__(markup, features)
+
+        def handle_starttag(self, *args, **kwargs):
+            self._nodes += 1
+            if self.limits.max_nodes and self._nodes > self.limits.max_nodes:
+                raise _LimitReached("nodes")
+            # checking the clock on every tag would cost more than it saves
+            if self._deadline is not None and self._nodes % 256 == 0 and time.perf_counter() > self._deadline:
+                raise _LimitReached("time")
+            return super().handle_starttag(*args, **kwargs)
+
+        def _feed(self):
+            try:
+                super()._feed()
+            except _LimitReached as e:
+                self.truncated = e.reason
+                # close out the partial tree the same way BeautifulSoup does at end of input
+                self.endData()
+                while self.currentTag is not None and self.currentTag.name != self.ROOT_TAG_NAME:
+                    self.popTag()
+
+    return BoundedSoup
+
+
+async def read_body(response, limit: int) -> bytes:
+    """Read at most limit bytes of an aiohttp response body (0 reads all of it).
+
+    ``response.content.read(n)`` returns whatever happens to be buffered, which for a
+    chunked response may be the first few KB only, so the body is read chunk by chunk
+    until limit bytes or the end of the stream.
+    """
+    if not limit:
+        return await response.read()
+    body = bytearray()
+    async for chunk in response.content.iter_any():
+        body += chunk
+        if len(body) >= limit:
+            break
+    return bytes(body[:limit])
+
+
+def decode_body(body: bytes, charset: Optional[str]) -> str:
+    """Decode a response body in its declared charset, or UTF-8 when it declares none or
+    one Python doesn't know (``charset=x-user-defined-bogus``)."""
+    try:
+        encoding = codecs.lookup(charset).name if charset else 'utf-8'
+    except LookupError:
+        encoding = 'utf-8'
+    return body.decode(encoding, errors='replace')
+
+
+def parse_html(html: str, limits: Optional[ParseLimits] = None):
+    """Parse html within limits; returns (soup, truncated) where truncated is None or the
+    limit that was hit ('bytes', 'nodes' or 'time')."""
+    limits = limits or ParseLimits.from_settings()
+    html, cut = truncate_html(html or "", limits.max_bytes)
+    soup = _bounded_soup_class()(html, "html.parser", limits)
+    return soup, soup.truncated or ("bytes" if cut else None)
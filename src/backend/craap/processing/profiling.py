@@ -0,0 +1,161 @@
+"""Per-request profiling helpers.
+
+``StageTimer`` records a stage-by-stage timing breakdown of an analysis and
+``SamplingProfiler`` periodically samples the stack of the thread running the
+request, producing collapsed stacks (``frame;frame;frame count`` lines) that can
+be fed to flamegraph tools.
+
+Profiling a single request is opt-in and access controlled (PROFILE_TOKEN); a
+small fraction of regular traffic can also be profiled in the background
+(PROFILE_SAMPLE_RATE) with the reports written to PROFILE_DIR, which is kept under
+PROFILE_MAX_FILES files and PROFILE_MAX_BYTES bytes by removing the oldest reports.
+"""
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from src.backend.craap.config import setting
+
+
+class StageTimer:
+    """Collects wall-clock durations of named stages, in the order they ran."""
+
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({"stage": name, "ms": round((time.perf_counter() - start) * 1000, 3)})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stages": list(self.stages),
+            "total_ms": round((time.perf_counter() - self._started) * 1000, 3),
+        }
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread at a fixed interval from a helper thread.
+
+    The sampled thread is the one that calls ``start()``. Under asyncio this is the
+    event loop thread, so samples taken while the request is awaiting I/O may show
+    other requests' frames or the idle selector.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="craap-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Return the samples in collapsed-stack format, most frequent first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+def profiling_allowed(token: Optional[str]) -> bool:
+    """True when PROFILE_TOKEN is configured and token matches it."""
+    expected = setting("PROFILE_TOKEN")
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(str(expected), str(token))
+
+
+def should_sample() -> bool:
+    """Decide whether a regular request is profiled in the background (PROFILE_SAMPLE_RATE)."""
+    rate = float(setting("PROFILE_SAMPLE_RATE", 0.0) or 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def write_profile(url: str, report: Dict[str, Any], stacks: Optional[str] = None) -> Optional[str]:
+    """Write a sampled profile to PROFILE_DIR; returns the JSON report path (None on failure)."""
+    directory = setting("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "craap-profiles")
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    base = os.path.join(directory, f"{stamp}-{os.getpid()}")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(base + ".json", "w", encoding="utf-8") as fh:
+            json.dump({"url": url, **report}, fh, indent=2)
+        if stacks:
+            with open(base + ".folded", "w", encoding="utf-8") as fh:
+                fh.write(stacks + "\n")
+    except OSError:
+        return None
+    prune_profiles(directory, int(setting("PROFILE_MAX_FILES", 1000) or 0),
+                   int(setting("PROFILE_MAX_BYTES", 100 * 1024 * 1024) or 0))
+    return base + ".json"
+
+
+def prune_profiles(directory: str, max_files: int, max_bytes: int) -> int:
+    """Remove the oldest reports in directory until at most max_files files and max_bytes
+    bytes are left (0 disables a limit); returns the number of files removed."""
+    if max_files <= 0 and max_bytes <= 0:
+        return 0
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith((".json", ".folded")):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, entry.path, stat.st_size))
+    except OSError:
+        return 0
+    files.sort()
+    count, total = len(files), sum(size for _, _, _, size in files)
+    removed = 0
+    for _, _, path, size in files:
+        if (max_files <= 0 or count <= max_files) and (max_bytes <= 0 or total <= max_bytes):
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        count, total, removed = count - 1, total - size, removed + 1
+    return removed
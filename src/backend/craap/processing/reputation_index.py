@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""Local IP/CIDR reputation index built from blocklist files.
+
+Loads CIDR blocklists (Spamhaus DROP/EDROP text or JSON-lines exports, or in-house lists
+with one CIDR per line), ASN blocklists (Spamhaus ASN-DROP or one ``AS<number>`` per line)
+and optional IP-range -> ASN mapping tables (iptoasn-style ``start end asn`` TSV or
+``cidr asn`` lines) into sorted, non-overlapping interval tables per address family;
+an address in nested ranges gets the most specific one. A lookup is a single binary search, so checking an IPv4 or IPv6 address takes
+microseconds and needs no network call.
+
+``get_reputation_index`` returns a process-wide ``LocalReputation`` configured from the
+REPUTATION_* settings; it re-reads the files when they change on disk (checked at most
+every REPUTATION_RELOAD_INTERVAL seconds, rebuilt in a background thread while the old
+index keeps answering), so lists can be updated without a restart.
+Lines that can't be parsed (malformed JSON, invalid networks or ASNs) are skipped and
+counted per file (``ReputationIndex.skipped``), so one bad line never empties the index.
+"""
+import argparse
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.backend.craap.config import WatchedFiles, setting, setting_list
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[int, int, str]
+
+
+class IntervalTable:
+    """Sorted, non-overlapping [start, end] integer intervals with a label each.
+
+    Nested ranges are split so that an address gets the label of the innermost
+    (most specific) range containing it, as with longest-prefix routing: 10.1.0.0/16
+    inside 10.0.0.0/8 keeps its own label and the /8 label covers the rest.
+    """
+
+    def __init__(self, intervals: Iterable[Interval], bits: int):
+        # IPv4 bounds fit in compact unsigned arrays; IPv6 needs Python ints
+        self.starts = array('L') if bits == 32 else []
+        self.ends = array('L') if bits == 32 else []
+        self.labels: List[str] = []
+        # ranges enclosing the current position, innermost last, and where the next segment starts
+        open_ranges: List[Interval] = []
+        pos = 0
+        for start, end, label in sorted(intervals, key=lambda i: (i[0], -i[1])):
+            # close the enclosing ranges that end before this one starts
+            while open_ranges and open_ranges[-1][1] < start:
+                _, closed_end, closed_label = open_ranges.pop()
+                self._add(pos, closed_end, closed_label)
+                pos = max(pos, closed_end + 1)
+            if open_ranges:
+                if open_ranges[-1][:2] == (start, end):
+                    # the same range listed twice: the first label wins
+                    continue
+                self._add(pos, start - 1, open_ranges[-1][2])
+            open_ranges.append((start, end, label))
+            pos = start
+        while open_ranges:
+            _, closed_end, closed_label = open_ranges.pop()
+            self._add(pos, closed_end, closed_label)
+            pos = max(pos, closed_end + 1)
+
+    def _add(self, start: int, end: int, label: str) -> None:
+        if start > end:
+            return
+        if self.labels and self.labels[-1] == label and self.ends[-1] + 1 == start:
+            self.ends[-1] = end
+            return
+        self.starts.append(start)
+        self.ends.append(end)
+        self.labels.append(label)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def find(self, value: int) -> Optional[str]:
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.labels[i]
+        return None
+
+
+def _strip_comment(line: str) -> str:
+    for marker in (';', '#'):
+        pos = line.find(marker)
+        if pos != -1:
+            line = line[:pos]
+    return line.strip()
+
+
+def _network_bounds(text: str) -> Tuple[int, int, int]:
+    network = ipaddress.ip_network(text.strip(), strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def _ip_to_int(ip: str) -> Tuple[int, int]:
+    # inet_pton is several times faster than ipaddress.ip_address on the lookup path
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except OSError:
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+    except OSError:
+        raise ValueError(f"{ip!r} does not appear to be an IPv4 or IPv6 address") from None
+
+
+def _parse_asn(text) -> int:
+    text = str(text).strip().upper()
+    return int(text[2:] if text.startswith('AS') else text)
+
+
+def _json_record(line: str) -> Optional[dict]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def _skip(skipped: Optional[Dict[str, int]], path: str) -> None:
+    if skipped is not None:
+        skipped[path] = skipped.get(path, 0) + 1
+
+
+def read_blocklist(path: str, skipped: Optional[Dict[str, int]] = None) -> List[Tuple[int, int, int, str]]:
+    """Parse a CIDR blocklist into (version, start, end, label) tuples.
+
+    Unparseable lines are skipped and counted in skipped[path] when a dict is passed.
+    """
+    name = os.path.basename(path)
+    entries = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                # Spamhaus JSON-lines export; the trailing metadata record has no cidr
+                record = _json_record(line)
+                if record is None:
+                    _skip(skipped, path)
+                    continue
+                if 'cidr' not in record:
+                    continue
+                cidr, label = record['cidr'], record.get('sblid')
+            else:
+                label = line.split(';', 1)[1].strip() if ';' in line else None
+                cidr = _strip_comment(line)
+                if not cidr:
+                    continue
+            try:
+                version, start, end = _network_bounds(str(cidr))
+            except ValueError:
+                _skip(skipped, path)
+                continue
+            entries.append((version, start, end, f'{name}:{label}' if label else name))
+    return entries
+
+
+def read_asn_list(path: str, skipped: Optional[Dict[str, int]] = None) -> Set[int]:
+    """Parse an ASN blocklist (``AS123 ; ...`` lines or Spamhaus JSON lines) into a set of ASNs.
+
+    Unparseable lines are skipped and counted in skipped[path] when a dict is passed.
+    """
+    asns = set()
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if line.startswith('{'):
+                record = _json_record(line)
+                try:
+                    if record is None:
+                        raise ValueError(line)
+                    if 'asn' in record:
+                        asns.add(_parse_asn(record['asn']))
+                except ValueError:
+                    _skip(skipped, path)
+                continue
+            line = _strip_comment(line)
+            if not line:
+                continue
+            try:
+                asns.add(_parse_asn(line.split()[0]))
+            except ValueError:
+                _skip(skipped, path)
+                continue
+    return asns
+
+
+def read_asn_map(path: str, skipped: Optional[Dict[str, int]] = None) -> List[Tuple[int, int, int, str]]:
+    """Parse an IP-range -> ASN table into (version, start, end, asn) tuples.
+
+    Accepts ``range_start range_end asn ...`` (iptoasn TSV) and ``cidr asn`` lines;
+    ranges with ASN 0 (not routed) are skipped. Unparseable lines are skipped and counted
+    in skipped[path] when a dict is passed.
+    """
+    entries = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            parts = _strip_comment(line).split()
+            try:
+                if len(parts) >= 3 and '/' not in parts[0]:
+                    first, last = ipaddress.ip_address(parts[0]), ipaddress.ip_address(parts[1])
+                    version, start, end, asn = first.version, int(first), int(last), _parse_asn(parts[2])
+                elif len(parts) >= 2:
+                    version, start, end = _network_bounds(parts[0])
+                    asn = _parse_asn(parts[1])
+                elif parts:
+                    raise ValueError(line)
+                else:
+                    continue
+            except ValueError:
+                _skip(skipped, path)
+                continue
+            if asn:
+                entries.append((version, start, end, str(asn)))
+    return entries
+
+
+class ReputationIndex:
+    """Immutable lookup structure built from a set of list files."""
+
+    def __init__(self, blocklists: Iterable[str] = (), asn_lists: Iterable[str] = (), asn_maps: Iterable[str] = ()):
+        # path -> number of lines that couldn't be parsed
+        self.skipped: Dict[str, int] = {}
+        blocked = [entry for path in blocklists for entry in read_blocklist(path, self.skipped)]
+        mapped = [entry for path in asn_maps for entry in read_asn_map(path, self.skipped)]
+        self.blocked = {v: IntervalTable(((s, e, l) for ver, s, e, l in blocked if ver == v), bits)
+                        for v, bits in ((4, 32), (6, 128))}
+        self.asn_map = {v: IntervalTable(((s, e, l) for ver, s, e, l in mapped if ver == v), bits)
+                        for v, bits in ((4, 32), (6, 128))}
+        self.asns: Set[int] = set()
+        for path in asn_lists:
+            self.asns |= read_asn_list(path, self.skipped)
+        for path, count in self.skipped.items():
+            logger.warning(f"Skipped {count} unparseable line(s) in {path}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'ipv4_ranges': len(self.blocked[4]),
+            'ipv6_ranges': len(self.blocked[6]),
+            'asns': len(self.asns),
+            'asn_map_ranges': len(self.asn_map[4]) + len(self.asn_map[6]),
+            'skipped_lines': sum(self.skipped.values()),
+        }
+
+    def asn_listed(self, asn) -> bool:
+        try:
+            return _parse_asn(asn) in self.asns
+        except (TypeError, ValueError):
+            return False
+
+    def lookup(self, ip: str) -> dict:
+        """Return a reputation summary for ip; raises ValueError for an invalid address."""
+        version, value = _ip_to_int(ip)
+        blocklist = self.blocked[version].find(value)
+        asn = self.asn_map[version].find(value)
+        asn_listed = asn is not None and int(asn) in self.asns
+        return {
+            'listed': blocklist is not None or asn_listed,
+            'blocklist': blocklist,
+            'ASN': int(asn) if asn is not None else None,
+            'asn_listed': asn_listed,
+            '_ip': ip,
+            '_source': 'local',
+        }
+
+
+class LocalReputation:
+    """Holds the current ReputationIndex and rebuilds it when one of its files changes.
+
+    Rebuilds after a change run in a background thread (an ip2asn-sized map takes
+    seconds); lookups keep using the previous index until the new one replaces it.
+    """
+
+    def __init__(self, blocklists: List[str], asn_lists: List[str] = (), asn_maps: List[str] = (),
+                 reload_interval: float = 30.0):
+        self.blocklists = list(blocklists)
+        self.asn_lists = list(asn_lists)
+        self.asn_maps = list(asn_maps)
+        self.files = WatchedFiles(self.blocklists + self.asn_lists + self.asn_maps, reload_interval)
+        self._lock = threading.Lock()
+        self._index: Optional[ReputationIndex] = None
+        self._rebuilding = False
+        self.reload()
+
+    def reload(self) -> ReputationIndex:
+        """Rebuild the index from the files now (missing files are skipped)."""
+        mtimes = self.files.current()
+        existing = lambda paths: [p for p in paths if mtimes.get(p, -1.0) >= 0]
+        index = ReputationIndex(existing(self.blocklists), existing(self.asn_lists), existing(self.asn_maps))
+        with self._lock:
+            self._index = index
+        self.files.mark(mtimes)
+        return index
+
+    def _rebuild(self) -> None:
+        try:
+            self.reload()
+        except Exception as e:
+            logger.warning(f"Could not rebuild the reputation index: {e}")
+        finally:
+            self._rebuilding = False
+
+    def index(self) -> ReputationIndex:
+        """Current index; starts a rebuild in the background if a file changed since the last check."""
+        if self.files.changed():
+            with self._lock:
+                start, self._rebuilding = not self._rebuilding, True
+            if start:
+                threading.Thread(target=self._rebuild, name='reputation-reload', daemon=True).start()
+        return self._index
+
+    def lookup(self, ip: str) -> dict:
+        return self.index().lookup(ip)
+
+    def asn_listed(self, asn) -> bool:
+        return self.index().asn_listed(asn)
+
+
+_index: Optional[LocalReputation] = None
+_index_lock = threading.Lock()
+
+
+def get_reputation_index() -> Optional[LocalReputation]:
+    """Process-wide local reputation index, or None when no lists are configured."""
+    global _index
+    if _index is None:
+        blocklists = setting_list('REPUTATION_BLOCKLISTS')
+        asn_lists = setting_list('REPUTATION_ASN_LISTS')
+        asn_maps = setting_list('REPUTATION_ASN_MAPS')
+        if not (blocklists or asn_lists or asn_maps):
+            return None
+        with _index_lock:
+            if _index is None:
+                _index = LocalReputation(blocklists, asn_lists, asn_maps,
+                                         reload_interval=float(setting('REPUTATION_RELOAD_INTERVAL', 30)))
+    return _index
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Look up IPs in local CIDR/ASN blocklists")
+    parser.add_argument('ips', nargs='+', help='IPv4/IPv6 addresses to check')
+    parser.add_argument('--blocklist', '-b', action='append', default=[], help='CIDR blocklist file (repeatable)')
+    parser.add_argument('--asn-list', '-a', action='append', default=[], help='ASN blocklist file (repeatable)')
+    parser.add_argument('--asn-map', '-m', action='append', default=[], help='IP range -> ASN table (repeatable)')
+    parser.add_argument('--bench', type=int, default=0, help='Time this many lookups per IP')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = ReputationIndex(args.blocklist, args.asn_list, args.asn_map)
+    print(f"index built in {(time.perf_counter() - start) * 1000:.1f} ms: {index.stats()}")
+
+    for ip in args.ips:
+        try:
+            print(json.dumps(index.lookup(ip)))
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            continue
+        if args.bench:
+            start = time.perf_counter()
+            for _ in range(args.bench):
+                index.lookup(ip)
+            print(f"  {(time.perf_counter() - start) / args.bench * 1e6:.2f} us per lookup")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""Per-domain extraction profiles.
+
+The generic extractors in ``MetaTagExtractor`` try a fixed chain of selectors on every
+page. A profile tells the extractor where a known site keeps a field, so pages of that
+site go straight to the right element. Profiles are read (through dynaconf, so TOML,
+YAML and JSON all work) from the files in EXTRACTION_PROFILE_FILES, e.g.::
+
+    [profiles."arxiv.org"]
+    title = ['meta[name="citation_title"]']
+    authors = ['meta[name="citation_author"]']
+    publication_date = ['meta[name="citation_date"]', 'meta[name="citation_online_date"]']
+    keywords = [{selector = 'meta[name="keywords"]', split = ","}]
+    fallback = true
+
+A rule is a CSS selector, optionally followed by ``@attribute`` (by default ``content``
+for meta tags, ``datetime`` for time elements, ``href`` for links and the text
+otherwise), or a table with ``selector``, ``attr`` and ``split``. Rules are tried in
+order and the first one producing a value wins. When none does, the generic extractor
+runs unless the profile sets ``fallback = false``.
+
+Host keys match the host with or without ``www.``; ``*.example.com`` matches every
+subdomain. All selectors are compiled once per load into a dispatch table keyed by
+host, and the files are re-read when they change (checked at most every
+EXTRACTION_PROFILE_RELOAD_INTERVAL seconds). Each rule counts how often it was tried
+and how often it matched (``stats``, served at ``GET /metrics``), so rules that never
+match can be pruned. The counters live in each worker process; every worker publishes
+them to the shared cache every RULE_STATS_INTERVAL seconds and ``GET /metrics`` sums
+what the workers published (``shared_rule_stats``).
+
+Usage:
+    python -m src.backend.craap.processing.rules conf/extraction_profiles.toml --url https://arxiv.org/abs/1706.03762
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.backend.craap.config import WatchedFiles, setting, setting_list
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# fields a profile may define (the HTML-derived MetaTagData fields)
+PROFILE_FIELDS = (
+    'publication_date', 'last_modification_date', 'author', 'authors', 'description',
+    'keywords', 'publisher', 'title', 'doi', 'language', 'content_type', 'generator',
+    'viewport', 'robots', 'refresh',
+)
+LIST_FIELDS = ('authors', 'keywords')
+DATE_FIELDS = ('publication_date', 'last_modification_date')
+
+# attribute read when a rule doesn't name one
+DEFAULT_ATTRS = {'meta': 'content', 'time': 'datetime', 'link': 'href'}
+
+# (profile host, field, selector) -> [tried, hits]
+RuleKey = Tuple[str, str, str]
+
+
+def _normalize_host(host: str) -> str:
+    host = (host or '').strip().lower().rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+
+@dataclass
+class Rule:
+    key: RuleKey
+    selector: str
+    matcher: Any  # compiled soupsieve selector
+    attr: Optional[str] = None
+    split: Optional[str] = None
+
+    def _value(self, element) -> Optional[str]:
+        attr = self.attr or DEFAULT_ATTRS.get(element.name)
+        value = element.get(attr) if attr else element.get_text(' ')
+        if isinstance(value, list):
+            value = ' '.join(value)
+        value = value.strip() if value else None
+        return value or None
+
+    def values(self, soup: BeautifulSoup, many: bool) -> List[str]:
+        elements = self.matcher.select(soup) if many else [self.matcher.select_one(soup)]
+        values = []
+        for element in elements:
+            value = self._value(element) if element is not None else None
+            if value is None:
+                continue
+            if self.split:
+                values.extend(v.strip() for v in value.split(self.split) if v.strip())
+            else:
+                values.append(value)
+        return values
+
+
+@dataclass
+class Profile:
+    host: str
+    rules: Dict[str, List[Rule]] = field(default_factory=dict)
+    fallback: bool = True
+
+
+def _doi_value(value: str) -> str:
+    if 'doi.org/' in value:
+        value = value.split('doi.org/', 1)[1]
+    if value.lower().startswith('doi:'):
+        value = value.split(':', 1)[1]
+    return value.strip()
+
+
+def compile_profiles(profiles: Dict[str, Any]) -> Dict[str, Profile]:
+    """Compile a {host: {field: [rules], 'fallback': bool}} mapping; invalid rules are skipped with a warning."""
+    import soupsieve
+
+    compiled = {}
+    for host, spec in (profiles or {}).items():
+        if not isinstance(spec, dict):
+            logger.warning(f"Extraction profile {host!r} is not a table, skipped")
+            continue
+        host = host.strip().lower()
+        profile = Profile(host=host, fallback=bool(spec.get('fallback', True)))
+        for name, rules in spec.items():
+            name = name.lower()
+            if name == 'fallback':
+                continue
+            if name not in PROFILE_FIELDS:
+                logger.warning(f"Extraction profile {host!r}: unknown field {name!r}, skipped")
+                continue
+            for raw in rules if isinstance(rules, list) else [rules]:
+                if isinstance(raw, dict):
+                    selector, attr, split = raw.get('selector'), raw.get('attr'), raw.get('split')
+                else:
+                    selector, _, attr = str(raw).partition('@')
+                    attr, split = attr or None, None
+                try:
+                    matcher = soupsieve.compile(selector.strip())
+                except Exception as e:
+                    logger.warning(f"Extraction profile {host!r}: invalid selector {selector!r} for {name}: {e}")
+                    continue
+                label = json.dumps(raw, sort_keys=True) if isinstance(raw, dict) else str(raw)
+                rule = Rule((host, name, label), selector.strip(), matcher, attr, split)
+                profile.rules.setdefault(name, []).append(rule)
+        compiled[host] = profile
+    return compiled
+
+
+class ExtractionRules:
+    """Dispatch table of compiled profiles keyed by host, with per-rule hit counters."""
+
+    def __init__(self, profiles: Optional[Dict[str, Any]] = None):
+        self._exact: Dict[str, Profile] = {}
+        self._wildcard: Dict[str, Profile] = {}
+        self._counts: Dict[RuleKey, List[int]] = {}
+        self._lock = threading.Lock()
+        self.load(profiles or {})
+
+    def load(self, profiles: Dict[str, Any]) -> None:
+        """Replace the profiles; counters of rules that are still defined are kept."""
+        compiled = compile_profiles(profiles)
+        exact, wildcard = {}, {}
+        for host, profile in compiled.items():
+            if host.startswith('*.'):
+                wildcard[_normalize_host(host[2:])] = profile
+            else:
+                exact[_normalize_host(host)] = profile
+        keys = {rule.key for p in compiled.values() for rules in p.rules.values() for rule in rules}
+        with self._lock:
+            self._exact, self._wildcard = exact, wildcard
+            self._counts = {key: self._counts.get(key, [0, 0]) for key in keys}
+
+    def __len__(self) -> int:
+        return len(self._exact) + len(self._wildcard)
+
+    def profile_for(self, url: str) -> Optional[Profile]:
+        """The profile for url's host: an exact host match first, then the closest wildcard."""
+        if not (self._exact or self._wildcard):
+            return None
+        host = _normalize_host(urlsplit(url).hostname or '')
+        profile = self._exact.get(host)
+        if profile is not None or not self._wildcard:
+            return profile
+        labels = host.split('.')
+        for i in range(1, len(labels) - 1):
+            profile = self._wildcard.get('.'.join(labels[i:]))
+            if profile is not None:
+                return profile
+        return None
+
+    def apply(self, profile: Profile, name: str, soup: BeautifulSoup,
+              normalize_date: Callable[[str], Optional[str]]) -> Any:
+        """Value of field name from the profile's rules (None / [] when no rule matched)."""
+        many = name in LIST_FIELDS
+        tried, values = [], []
+        for rule in profile.rules[name]:
+            tried.append(rule.key)
+            values = rule.values(soup, many)
+            if name in DATE_FIELDS:
+                values = [d for d in map(normalize_date, values) if d][:1]
+            elif name == 'doi':
+                values = [v for v in map(_doi_value, values) if v]
+            if values:
+                break
+        # pages are extracted on several threads at once
+        with self._lock:
+            for key in tried:
+                self._counts.setdefault(key, [0, 0])[0] += 1
+            if values:
+                self._counts[tried[-1]][1] += 1
+        if not values:
+            return [] if many else None
+        if many:
+            seen = set()
+            return [v for v in values if not (v in seen or seen.add(v))]
+        return values[0]
+
+    def counts(self) -> Dict[RuleKey, List[int]]:
+        """Copy of this process's [tried, hits] counter per rule."""
+        with self._lock:
+            return {key: list(counts) for key, counts in self._counts.items()}
+
+    def stats(self, counts: Optional[Dict[RuleKey, List[int]]] = None) -> List[Dict[str, Any]]:
+        """Per-rule counters (this process's unless given), rules tried but never matched first."""
+        counts = self.counts() if counts is None else counts
+        rows = [
+            {'profile': host, 'field': name, 'rule': rule, 'tried': tried, 'hits': hits}
+            for (host, name, rule), (tried, hits) in counts.items()
+        ]
+        return sorted(rows, key=lambda r: (r['hits'] > 0 or r['tried'] == 0, r['profile'], r['field']))
+
+
+def _plain(value: Any) -> Any:
+    # dynaconf hands back its own dict/list subclasses
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def load_profile_files(paths: List[str]) -> Dict[str, Any]:
+    """Merge the ``profiles`` tables of the given files (later files win per host)."""
+    from dynaconf import Dynaconf
+
+    profiles: Dict[str, Any] = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        data = Dynaconf(settings_files=[path], envvar_prefix="CRAAP_EXTRACTION", environments=False,
+                        load_dotenv=False)
+        for host, spec in dict(data.get('profiles') or {}).items():
+            profiles[host] = _plain(spec)
+    return profiles
+
+
+class ProfileFiles:
+    """ExtractionRules loaded from files and reloaded when one of them changes."""
+
+    def __init__(self, paths: List[str], reload_interval: float = 30.0, publish_interval: float = 30.0):
+        self.paths = list(paths)
+        self.files = WatchedFiles(self.paths, reload_interval)
+        self.publish_interval = publish_interval
+        self.rules = ExtractionRules()
+        self._lock = threading.Lock()
+        # pid the publisher thread runs in (a forked worker has to start its own)
+        self._publisher_pid: Optional[int] = None
+        self.reload()
+
+    def reload(self) -> ExtractionRules:
+        """Re-read the files now; a file that fails to load leaves the current rules in place."""
+        self.files.mark(self.files.current())
+        try:
+            self.rules.load(load_profile_files(self.paths))
+        except Exception as e:
+            logger.warning(f"Could not load extraction profiles from {self.paths}: {e}")
+        return self.rules
+
+    def _publish_loop(self) -> None:
+        while True:
+            time.sleep(self.publish_interval)
+            try:
+                publish_rule_stats(self.rules)
+            except Exception as e:
+                logger.warning(f"Could not publish extraction rule counters: {e}")
+
+    def current(self) -> ExtractionRules:
+        if self._publisher_pid != os.getpid() and self.publish_interval > 0:
+            with self._lock:
+                if self._publisher_pid != os.getpid():
+                    self._publisher_pid = os.getpid()
+                    threading.Thread(target=self._publish_loop, name='rule-stats', daemon=True).start()
+        if self.files.changed():
+            return self.reload()
+        return self.rules
+
+
+RULE_STATS_KEY = 'rule-stats'
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def publish_rule_stats(rules: ExtractionRules, cache=None) -> None:
+    """Store this worker's rule counters in the shared cache, for ``shared_rule_stats``."""
+    from src.backend.craap.processing.cache import get_cache
+
+    cache = cache or get_cache()
+    # one key per worker, so workers never write over each other's counters
+    cache.set_json(f'{RULE_STATS_KEY}:{_worker_id()}',
+                   [[*key, *counts] for key, counts in rules.counts().items()],
+                   ttl=float(setting('RULE_STATS_TTL', 86400)))
+
+
+def shared_rule_stats(rules: ExtractionRules, cache=None) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Rule counters summed over every worker that published them (this one with its live
+    counts), and the workers that were summed. Only rules that are currently defined are
+    reported; a worker whose counters expired (RULE_STATS_TTL) drops out.
+    """
+    from src.backend.craap.processing.cache import get_cache
+
+    cache = cache or get_cache()
+    publish_rule_stats(rules, cache)
+    own = _worker_id()
+    totals = rules.counts()
+    reporting = [own]
+    for key in sorted(cache.keys(f'{RULE_STATS_KEY}:')):
+        worker = key[len(RULE_STATS_KEY) + 1:]
+        rows = cache.get_json(key) if worker != own else None
+        if not isinstance(rows, list):
+            continue
+        reporting.append(worker)
+        for host, name, rule, tried, hits in rows:
+            counts = totals.get((host, name, rule))
+            if counts is not None:
+                counts[0] += tried
+                counts[1] += hits
+    return rules.stats(totals), reporting
+
+
+_profiles: Optional[ProfileFiles] = None
+_profiles_lock = threading.Lock()
+
+
+def get_extraction_rules() -> Optional[ExtractionRules]:
+    """Process-wide extraction rules, or None when no profile files are configured."""
+    global _profiles
+    if _profiles is None:
+        paths = setting_list('EXTRACTION_PROFILE_FILES')
+        if not paths:
+            return None
+        with _profiles_lock:
+            if _profiles is None:
+                _profiles = ProfileFiles(paths, float(setting('EXTRACTION_PROFILE_RELOAD_INTERVAL', 30)),
+                                         float(setting('RULE_STATS_INTERVAL', 30)))
+    return _profiles.current()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Validate extraction profile files and show the profile for URLs")
+    parser.add_argument('files', nargs='+', help='Profile files (TOML/YAML/JSON)')
+    parser.add_argument('--url', action='append', default=[], help='Show which profile handles this URL (repeatable)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rules = ExtractionRules(load_profile_files(args.files))
+    count = sum(1 for _ in rules.stats())
+    print(f"{len(rules)} profiles, {count} rules compiled in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for url in args.url:
+        profile = rules.profile_for(url)
+        if profile is None:
+            print(f"{url}: no profile (generic extraction)")
+            continue
+        print(json.dumps({
+            'url': url,
+            'profile': profile.host,
+            'fallback': profile.fallback,
+            'rules': {name: [r.key[2] for r in rules_] for name, rules_ in profile.rules.items()},
+        }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())